@@ -32,6 +32,22 @@ class BenchmarkingService(rpyc.Service):
         print("  handling request for running experiment ", insnseq)
         return self.lowleveleval.run_experiment(insnseq, **kwargs)
 
+    def exposed_run_experiments(self, insnseqs, callback=None, **kwargs):
+        """ Run all experiments in the list insnseqs with the same kwargs
+            and return the list of their results, in order. If callback is
+            given, it is called with the index and the result of each
+            experiment as soon as it has finished.
+        """
+        print("  handling request for running {} experiments".format(len(insnseqs)))
+        res = []
+        for x, insnseq in enumerate(insnseqs):
+            print("  running experiment ", insnseq)
+            r = self.lowleveleval.run_experiment(insnseq, **kwargs)
+            if callback is not None:
+                callback(x, r)
+            res.append(r)
+        return res
+
     def exposed_gen_code(self, insnseq, **kwargs):
         print("  handling request for generating code for experiment ", insnseq)
         return self.lowleveleval.gen_code(insnseq, **kwargs)
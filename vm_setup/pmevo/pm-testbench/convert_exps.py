@@ -0,0 +1,27 @@
+#! /usr/bin/env python3
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import argparse
+
+from utils.experiment import CompactExperimentList
+from utils.experiment_store import load_experiment_list, store_experiment_list, binary_extension
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Convert experiment lists between the json and the binary format (chosen by the file extension, binary files end with "{}")'.format(binary_extension))
+
+    argparser.add_argument('infile', metavar='INFILE', help='input experiment list')
+    argparser.add_argument('outfile', metavar='OUTFILE', help='output experiment list')
+
+    args = argparser.parse_args()
+
+    # only the cycles of results are kept in the binary format anyway
+    elist = load_experiment_list(args.infile, cls=CompactExperimentList)
+
+    store_experiment_list(elist, args.outfile)
+
+    print("Converted {} experiments from '{}' to '{}'.".format(len(elist), args.infile, args.outfile))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,25 @@
 
+#include <algorithm>
 #include <cstdint>
+#include <thread>
 #include <vector>
 #include <iostream>
 
+enum class Algorithm {
+    // test every uop against every subset of ports
+    Scan,
+    // compute the uop mass of all subsets of ports with a sum-over-subsets
+    // dynamic program, independent of the number of distinct uops
+    SubsetSum,
+    // only test port sets that are unions of occurring uops, fall back to Scan
+    // if there are more than maxClosure of them
+    Sparse,
+};
+
 class FasterProcessor {
 public:
-    FasterProcessor(uint32_t n);
+    FasterProcessor(uint32_t n, Algorithm algo = Algorithm::Scan, size_t maxClosure = 4096,
+            uint32_t numThreads = 1, uint32_t parallelThreshold = 1 << 14);
 
     void add(uint32_t uop, uint32_t n);
 
@@ -14,13 +28,31 @@ public:
     double compute(void);
 
 private:
+    double computeScan(void);
+    double computeScanRange(uint32_t begin, uint32_t end);
+    double computeSubsetSum(void);
+    double computeSparse(void);
+
     uint32_t numPorts;
+    Algorithm algo;
+    size_t maxClosure;
+    // the scan over port subsets is split over numThreads threads if there
+    // are at least parallelThreshold subsets
+    uint32_t numThreads;
+    uint32_t parallelThreshold;
     std::vector<uint32_t> uops;
     std::vector<uint32_t> numbers;
+    std::vector<double> mass;
+    std::vector<uint32_t> closure;
 };
 
-FasterProcessor::FasterProcessor(uint32_t n) {
+FasterProcessor::FasterProcessor(uint32_t n, Algorithm algo, size_t maxClosure,
+        uint32_t numThreads, uint32_t parallelThreshold) {
     this->numPorts = n;
+    this->algo = algo;
+    this->maxClosure = maxClosure;
+    this->numThreads = std::max(numThreads, 1u);
+    this->parallelThreshold = parallelThreshold;
 }
 
 void FasterProcessor::add(uint32_t uop, uint32_t n) {
@@ -34,13 +66,128 @@ void FasterProcessor::clear(void) {
 }
 
 double FasterProcessor::compute(void) {
+    switch (this->algo) {
+        case Algorithm::SubsetSum:
+            return this->computeSubsetSum();
+        case Algorithm::Sparse:
+            return this->computeSparse();
+        case Algorithm::Scan:
+        default:
+            return this->computeScan();
+    }
+}
+
+double FasterProcessor::computeScan(void) {
+    uint32_t max_uop = 1 << this->numPorts;
+
+    uint32_t num_threads = this->numThreads;
+    if (num_threads <= 1 || max_uop < this->parallelThreshold) {
+        return this->computeScanRange(1, max_uop);
+    }
+
+    // split the subsets into contiguous ranges and reduce the maxima of the
+    // ranges afterwards
+    std::vector<double> results(num_threads, 0.0);
+    std::vector<std::thread> threads;
+    uint32_t chunk = (max_uop - 1 + num_threads - 1) / num_threads;
+    for (uint32_t t = 0; t < num_threads; ++t) {
+        uint32_t begin = 1 + t * chunk;
+        uint32_t end = std::min(max_uop, begin + chunk);
+        if (begin >= end) {
+            break;
+        }
+        threads.emplace_back([this, &results, t, begin, end]() {
+            results[t] = this->computeScanRange(begin, end);
+        });
+    }
+    for (auto& th : threads) {
+        th.join();
+    }
+    return *std::max_element(results.begin(), results.end());
+}
+
+double FasterProcessor::computeScanRange(uint32_t begin, uint32_t end) {
     double max_val = 0.0;
+
+    auto& uops = this->uops;
+    auto& numbers = this->numbers;
+    size_t max_i = uops.size();
+    for (uint32_t current_q = begin; current_q < end; ++current_q) {
+        double val = 0.0;
+        for (size_t i = 0; i < max_i; ++i) {
+            if ((~current_q & uops[i]) == 0){
+                val += numbers[i];
+            }
+        }
+        val = val / __builtin_popcount(current_q);
+        if (val > max_val) {
+            max_val = val;
+        }
+    }
+    return max_val;
+}
+
+double FasterProcessor::computeSubsetSum(void) {
     uint32_t max_uop = 1 << this->numPorts;
 
+    // mass[q] is the number of uops that can only be executed on ports in q
+    auto& mass = this->mass;
+    mass.assign(max_uop, 0.0);
+
     auto& uops = this->uops;
     auto& numbers = this->numbers;
     size_t max_i = uops.size();
+    for (size_t i = 0; i < max_i; ++i) {
+        mass[uops[i]] += numbers[i];
+    }
+
+    for (uint32_t bit = 1; bit < max_uop; bit <<= 1) {
+        for (uint32_t current_q = 0; current_q < max_uop; ++current_q) {
+            if (current_q & bit) {
+                mass[current_q] += mass[current_q ^ bit];
+            }
+        }
+    }
+
+    double max_val = 0.0;
     for (uint32_t current_q = 1; current_q < max_uop; ++current_q) {
+        double val = mass[current_q] / __builtin_popcount(current_q);
+        if (val > max_val) {
+            max_val = val;
+        }
+    }
+    return max_val;
+}
+
+double FasterProcessor::computeSparse(void) {
+    auto& uops = this->uops;
+    auto& numbers = this->numbers;
+    size_t max_i = uops.size();
+
+    // The maximum is always reached for a union of occurring uops, so compute
+    // the closure of the occurring uops under union.
+    auto& closure = this->closure;
+    closure.clear();
+    for (size_t i = 0; i < max_i; ++i) {
+        uint32_t u = uops[i];
+        if (u == 0) {
+            // uops without ports are contained in every port set
+            return this->computeScan();
+        }
+        size_t num_present = closure.size();
+        for (size_t j = 0; j < num_present; ++j) {
+            closure.push_back(closure[j] | u);
+        }
+        closure.push_back(u);
+        std::sort(closure.begin(), closure.end());
+        closure.erase(std::unique(closure.begin(), closure.end()), closure.end());
+        if (closure.size() > this->maxClosure) {
+            return this->computeScan();
+        }
+    }
+
+    double max_val = 0.0;
+    for (uint32_t current_q : closure) {
         double val = 0.0;
         for (size_t i = 0; i < max_i; ++i) {
             if ((~current_q & uops[i]) == 0){
@@ -57,27 +204,176 @@ double FasterProcessor::compute(void) {
 
 #ifndef NOPYBIND
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+#include <pybind11/stl.h>
+
+#include <map>
+#include <tuple>
 
 namespace py = pybind11;
 
+template <typename T>
+using CArray = py::array_t<T, py::array::c_style | py::array::forcecast>;
+
+// Compute the cycles for a batch of experiments in CSR format: the uops of
+// experiment e are uops[offsets[e]:offsets[e+1]], with the corresponding
+// numbers of occurrences in counts.
+CArray<double> computeBatch(FasterProcessor& fp, CArray<int64_t> offsets,
+        CArray<uint32_t> uops, CArray<uint32_t> counts) {
+    if (offsets.ndim() != 1 || uops.ndim() != 1 || counts.ndim() != 1) {
+        throw std::invalid_argument("compute_batch expects one-dimensional arrays");
+    }
+    if (uops.size() != counts.size()) {
+        throw std::invalid_argument("compute_batch expects as many counts as uops");
+    }
+    py::ssize_t num_exps = offsets.size() - 1;
+    if (num_exps < 0) {
+        throw std::invalid_argument("compute_batch expects at least one offset");
+    }
+
+    auto res = CArray<double>(num_exps);
+
+    auto o = offsets.unchecked<1>();
+    auto u = uops.unchecked<1>();
+    auto c = counts.unchecked<1>();
+    auto r = res.mutable_unchecked<1>();
+
+    for (py::ssize_t e = 0; e < num_exps; ++e) {
+        if (o(e) > o(e + 1) || o(e + 1) > uops.size()) {
+            throw std::out_of_range("compute_batch got invalid offsets");
+        }
+    }
+
+    {
+        py::gil_scoped_release release;
+        for (py::ssize_t e = 0; e < num_exps; ++e) {
+            fp.clear();
+            for (int64_t i = o(e); i < o(e + 1); ++i) {
+                fp.add(u(i), c(i));
+            }
+            r(e) = fp.compute();
+        }
+    }
+
+    return res;
+}
+
+// An instruction table in CSR format: the (uop, count) pairs of instruction
+// i are at positions offsets[i]:offsets[i+1] of the uop and count arrays.
+using InsnTable = std::tuple<CArray<int64_t>, CArray<uint32_t>, CArray<uint32_t>>;
+
+// Compute the cycles of the experiments given in CSR format (the instruction
+// ids of experiment e are insns[exp_offsets[e]:exp_offsets[e+1]]) for each of
+// the mappings given as instruction tables. The result has one row per
+// mapping and one column per experiment.
+CArray<double> computeMappings(FasterProcessor& fp, std::vector<InsnTable> tables,
+        CArray<int64_t> exp_offsets, CArray<int64_t> insns) {
+    if (exp_offsets.ndim() != 1 || insns.ndim() != 1) {
+        throw std::invalid_argument("compute_mappings expects one-dimensional arrays");
+    }
+    py::ssize_t num_exps = exp_offsets.size() - 1;
+    if (num_exps < 0) {
+        throw std::invalid_argument("compute_mappings expects at least one experiment offset");
+    }
+    auto eo = exp_offsets.unchecked<1>();
+    auto ei = insns.unchecked<1>();
+    for (py::ssize_t e = 0; e < num_exps; ++e) {
+        if (eo(e) > eo(e + 1) || eo(e + 1) > insns.size()) {
+            throw std::out_of_range("compute_mappings got invalid experiment offsets");
+        }
+    }
+
+    py::ssize_t num_mappings = tables.size();
+    std::vector<decltype(std::get<0>(tables[0]).unchecked<1>())> table_offsets;
+    std::vector<decltype(std::get<1>(tables[0]).unchecked<1>())> table_uops;
+    std::vector<decltype(std::get<2>(tables[0]).unchecked<1>())> table_counts;
+    for (auto& t : tables) {
+        auto& offsets = std::get<0>(t);
+        auto& uops = std::get<1>(t);
+        auto& counts = std::get<2>(t);
+        if (offsets.ndim() != 1 || uops.ndim() != 1 || counts.ndim() != 1) {
+            throw std::invalid_argument("compute_mappings expects one-dimensional arrays");
+        }
+        if (uops.size() != counts.size() || offsets.size() < 1) {
+            throw std::invalid_argument("compute_mappings got an invalid instruction table");
+        }
+        auto o = offsets.unchecked<1>();
+        py::ssize_t num_insns = offsets.size() - 1;
+        for (py::ssize_t i = 0; i < num_insns; ++i) {
+            if (o(i) > o(i + 1) || o(i + 1) > uops.size()) {
+                throw std::out_of_range("compute_mappings got invalid instruction table offsets");
+            }
+        }
+        for (py::ssize_t k = 0; k < insns.size(); ++k) {
+            if (ei(k) < 0 || ei(k) >= num_insns) {
+                throw std::out_of_range("compute_mappings got an instruction id that is not in the table");
+            }
+        }
+        table_offsets.push_back(o);
+        table_uops.push_back(uops.unchecked<1>());
+        table_counts.push_back(counts.unchecked<1>());
+    }
+
+    auto res = CArray<double>({num_mappings, num_exps});
+    auto r = res.mutable_unchecked<2>();
+
+    {
+        py::gil_scoped_release release;
+        std::map<uint32_t, uint32_t> weights;
+        for (py::ssize_t m = 0; m < num_mappings; ++m) {
+            auto& o = table_offsets[m];
+            auto& u = table_uops[m];
+            auto& c = table_counts[m];
+            for (py::ssize_t e = 0; e < num_exps; ++e) {
+                // merge the entries of the instructions of the experiment
+                weights.clear();
+                for (int64_t k = eo(e); k < eo(e + 1); ++k) {
+                    int64_t i = ei(k);
+                    for (int64_t j = o(i); j < o(i + 1); ++j) {
+                        weights[u(j)] += c(j);
+                    }
+                }
+                fp.clear();
+                for (auto& entry : weights) {
+                    fp.add(entry.first, entry.second);
+                }
+                r(m, e) = fp.compute();
+            }
+        }
+    }
+
+    return res;
+}
+
 PYBIND11_MODULE(cppfastproc, m) {
+    py::enum_<Algorithm>(m, "Algorithm")
+        .value("Scan", Algorithm::Scan)
+        .value("SubsetSum", Algorithm::SubsetSum)
+        .value("Sparse", Algorithm::Sparse);
+
     py::class_<FasterProcessor>(m, "FP")
-        .def(py::init<int>())
+        .def(py::init<int, Algorithm, size_t, uint32_t, uint32_t>(), py::arg("n"),
+                py::arg("algo") = Algorithm::Scan, py::arg("max_closure") = 4096,
+                py::arg("num_threads") = 1, py::arg("parallel_threshold") = 1 << 14)
         .def("add", &FasterProcessor::add)
         .def("clear", &FasterProcessor::clear)
-        .def("compute", &FasterProcessor::compute);
+        .def("compute", &FasterProcessor::compute)
+        .def("compute_batch", &computeBatch, py::arg("offsets"), py::arg("uops"), py::arg("counts"))
+        .def("compute_mappings", &computeMappings, py::arg("tables"), py::arg("exp_offsets"), py::arg("insns"));
 }
 
 #endif
 
 
 int main(void) {
-    auto fp = FasterProcessor(3);
-    fp.add(04, 1); // mul
-    fp.add(06, 2); // add
-    fp.add(01, 1); // store
+    for (auto algo : {Algorithm::Scan, Algorithm::SubsetSum, Algorithm::Sparse}) {
+        auto fp = FasterProcessor(3, algo, 4096, 2, 0);
+        fp.add(04, 1); // mul
+        fp.add(06, 2); // add
+        fp.add(01, 1); // store
 
-    auto res = fp.compute();
+        auto res = fp.compute();
 
-    std::cout << "Result:" << res << "\n";
+        std::cout << "Result:" << res << "\n";
+    }
 }
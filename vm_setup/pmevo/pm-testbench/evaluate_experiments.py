@@ -8,7 +8,8 @@ import re
 import sys
 
 from utils.mapping import Mapping
-from utils.experiment import ExperimentList
+from utils.experiment import ExperimentList, CompactExperimentList
+from utils.experiment_store import load_experiment_list, store_experiment_list, binary_extension
 from processors.processor import Processor
 from processors.remote_processor import RemoteProcessor
 
@@ -20,7 +21,10 @@ def main():
     argparser.add_argument('-m', '--mapping', metavar='FILE', default=None, help='input mapping in json format')
     argparser.add_argument('-x', '--identifier', metavar="ID", required=True, help='unique identifier of the used processor for adding into the experiment list')
     argparser.add_argument('-o', '--out', metavar="FILE", default=None, help='name for the resulting output experiment lists')
-    argparser.add_argument('exps', metavar='FILE', nargs='+', help='input experiment list in json format')
+    argparser.add_argument('-j', '--jobs', metavar="N", type=int, default=1, help='number of worker processes for evaluating experiments in parallel (default: 1)')
+    argparser.add_argument('--chunksize', metavar="N", type=int, default=None, help='number of experiments per work item for parallel evaluation')
+    argparser.add_argument('--compact', action='store_true', help='store the experiments in a compact columnar form (only keeps the cycles of results)')
+    argparser.add_argument('exps', metavar='FILE', nargs='+', help='input experiment list in json or binary format (by extension)')
 
     add_client_args(argparser)
 
@@ -40,9 +44,10 @@ def main():
 
     arch = proc.get_arch()
 
+    elist_cls = CompactExperimentList if args.compact else ExperimentList
+
     for exps in args.exps:
-        with open(exps, 'r') as infile:
-            elist = ExperimentList.from_json(infile, arch)
+        elist = load_experiment_list(exps, arch, cls=elist_cls)
 
         present_ids = [ ores["id"] for ores in elist.exps[0].other_results ]
         if identifier in present_ids:
@@ -50,14 +55,22 @@ def main():
             sys.exit(1)
 
         percentage_step = 10
-        next_percentage = 0
         num_exps = len(elist.exps)
         print("Evaluating experiments from {} with a {}...".format(exps, proc.get_description()))
-        for x, e in enumerate(elist):
-            if x * 100 / num_exps >= next_percentage:
-                print("  {}%".format(next_percentage))
-                next_percentage += percentage_step
-            result = proc.execute(e.iseq)
+        if args.jobs != 1:
+            print("  using {} worker processes".format(args.jobs))
+            results = proc.execute_parallel([ e.iseq for e in elist ], jobs=args.jobs, chunk_size=args.chunksize)
+        else:
+            # evaluate the experiments in batches so that processors can
+            # exploit evaluating many experiments at once
+            results = []
+            batch_size = max(1, (num_exps * percentage_step + 99) // 100)
+            for start in range(0, num_exps, batch_size):
+                print("  {}%".format(start * 100 // num_exps))
+                batch = elist.exps[start:start + batch_size]
+                results += proc.execute_many([ e.iseq for e in batch ])
+
+        for e, result in zip(elist, results):
             result["id"] = identifier
             result["creation_date"] = datetime.datetime.now().isoformat()
             e.other_results.append(result)
@@ -67,8 +80,9 @@ def main():
             outname = args.out
         else:
             inname = exps
-            if inname.endswith(".json"):
-                outname = inname[:-len(".json")]
+            ext = binary_extension if inname.endswith(binary_extension) else ".json"
+            if inname.endswith(ext):
+                outname = inname[:-len(ext)]
             else:
                 outname = inname
 
@@ -80,10 +94,9 @@ def main():
             else:
                 outname += "_eval01"
 
-            outname += ".json"
+            outname += ext
 
-        with open(outname, "w") as outfile:
-            elist.to_json(outfile)
+        store_experiment_list(elist, outname)
 
 if __name__ == "__main__":
     main()
@@ -9,7 +9,8 @@ import sys
 
 from processors.remote_processor import RemoteProcessor
 from utils.client import add_client_args
-from utils.jsonable import Vault, filename_append
+from utils.jsonable import LogVault, filename_append
+from utils.measurement_store import MeasurementStore
 from utils.experiment import ExperimentList
 from utils.sample_experiments import sample_experiments
 from utils.partition_insns import create_partition
@@ -39,6 +40,8 @@ def main():
             help='seed for random number generator (default: {})'.format(424242))
     argparser.add_argument('--vault', metavar="FILE", default=None,
             help="name of a file to use for storing intermediate results")
+    argparser.add_argument('--store', metavar="FILE", default=None,
+            help="name of a measurement store database for reusing results of experiments that were already measured on the same server with the same parameters")
     argparser.add_argument('--eval', metavar=["NUM", "MIN", "MAX"], nargs=3, default=None, help="generate NUM uniformly sampled evaluation tests with a length between MIN and MAX")
     argparser.add_argument('--step', metavar=["NUM", "MIN", "MAX"], nargs=3, default=None, help="for each length between MIN and MAX, generate NUM uniformly sampled evaluation tests with that length")
     argparser.add_argument('--exps', metavar='FILE', default=None,
@@ -54,40 +57,56 @@ def main():
 
     random.seed(args.seed)
 
-    proc = RemoteProcessor(hostname=args.host, port=args.port, sslpath=args.sslpath)
+    store = None
+    if args.store is not None:
+        store = MeasurementStore(args.store)
+
+    proc = RemoteProcessor(hostname=args.host, port=args.port, sslpath=args.sslpath, store=store)
     arch = proc.get_arch()
 
     vault = None
     if args.vault is not None:
-        vault = Vault(args.vault)
+        vault = LogVault(args.vault)
 
     insns = arch.insn_list()
 
 
+    def print_store_stats():
+        if store is not None:
+            stats = store.get_stats()
+            print("Measurement store: {hits} hits, {misses} misses, {inserts} new results.".format(**stats))
+
     dropped_runs = []
 
     prog_id = 0
-    def eval_elist(elist):
+    def eval_result(e, res):
         nonlocal prog_id, dropped_runs
-        for x, e in enumerate(elist, start=1):
-            print("Running experiment {curr} of {num}: {exp}".format(curr=x, num=len(elist.exps), exp=repr(e)))
-            res = proc.execute(e.iseq,
+        e.result = res
+        if res["cycles"] is None:
+            print("Failed to evaluate an experiment:", file=sys.stderr)
+            print("  experiment: {}".format(repr(e)), file=sys.stderr)
+            print("  result: {}".format(e.get_result()), file=sys.stderr)
+            sys.exit(1)
+        if len(res["invalid_runs"]) > 0:
+            dropped_runs.append(res["invalid_runs"])
+        print("  Result for {}: {}".format(repr(e), e.get_result()))
+        if vault is not None:
+            vault.add(e, progress_id=prog_id)
+            prog_id += 1
+
+    def eval_elist(elist):
+        # run the experiments in batches with one request per batch
+        exps = list(elist)
+        for start in range(0, len(exps), proc.batch_size):
+            batch = exps[start:start + proc.batch_size]
+            print("Running experiments {first} to {last} of {num}...".format(first=start + 1, last=start + len(batch), num=len(exps)))
+            results = proc.execute_many([ e.iseq for e in batch ],
                     repetitions = args.repetitions,
                     target_time_us = args.targettime,
                     num_insns_per_iteration = args.insnsperiteration,
                     max_uncertainty = args.epsilon * 0.5)
-            e.result = res
-            if res["cycles"] is None:
-                print("Failed to evaluate an experiment:", file=sys.stderr)
-                print("  experiment: {}".format(repr(e)), file=sys.stderr)
-                print("  result: {}".format(e.get_result()), file=sys.stderr)
-                sys.exit(1)
-            if len(res["invalid_runs"]) > 0:
-                dropped_runs.append(res["invalid_runs"])
-            print("  Result: {}".format(e.get_result()))
-            if vault is not None:
-                vault.add(e, progress_id=prog_id)
-                prog_id += 1
+            for e, res in zip(batch, results):
+                eval_result(e, res)
 
     if args.step is not None:
         num, minl, maxl = map(int, args.step)
@@ -110,6 +129,7 @@ def main():
 
         if vault is not None:
             vault.finalize(False)
+        print_store_stats()
         return
 
     if args.eval is not None:
@@ -149,6 +169,7 @@ def main():
 
         if vault is not None:
             vault.finalize(False)
+        print_store_stats()
 
         return
 
@@ -250,6 +271,7 @@ def main():
 
     if vault is not None:
         vault.finalize(False)
+    print_store_stats()
 
 if __name__ == "__main__":
     main()
@@ -5,7 +5,8 @@ import argparse
 import datetime
 import json
 import os
-from utils.experiment import ExperimentList
+from utils.experiment import CompactExperimentList
+from utils.experiment_store import load_experiment_list
 
 import seaborn as sns
 
@@ -54,7 +55,7 @@ def main():
     default_report = os.path.expanduser("~/reports/accuracy_report.json")
     argparser = argparse.ArgumentParser(description='Crunch the other_result entries of an experiment lists for statistics and plots')
 
-    argparser.add_argument('exps', metavar='FILE', nargs='+', help='input experiment list(s) in json format')
+    argparser.add_argument('exps', metavar='FILE', nargs='+', help='input experiment list(s) in json or binary format (by extension)')
     argparser.add_argument('-x', '--identifier', metavar="ID", default=None, help='only consider other_results with this identifier')
 
     argparser.add_argument('-p', '--plot', metavar='FILE', default=None, help='plot the results in the given file (use \'show\' for directly displaying the plot instead)')
@@ -67,8 +68,7 @@ def main():
 
     multiple_files = len(args.exps) > 1
     for elist_file in args.exps:
-        with open(elist_file, 'r') as infile:
-            elist = ExperimentList.from_json(infile)
+        elist = load_experiment_list(elist_file, cls=CompactExperimentList)
 
         exp_len = len(elist.exps[0].iseq)
 
@@ -4,7 +4,8 @@
 import argparse
 import datetime
 import json
-from utils.experiment import ExperimentList
+from utils.experiment import CompactExperimentList
+from utils.experiment_store import load_experiment_list
 
 import os.path
 
@@ -29,7 +30,7 @@ def main():
     argparser = argparse.ArgumentParser(description='Crunch the other_result entries of an experiment lists for statistics and plots')
 
     argparser.add_argument('-x', '--identifier', metavar="ID", default=None, help='only consider other_results with this identifier')
-    argparser.add_argument('exps', metavar='FILE', nargs='+', help='input experiment list(s) in json format')
+    argparser.add_argument('exps', metavar='FILE', nargs='+', help='input experiment list(s) in json or binary format (by extension)')
     argparser.add_argument('-r', '--report', metavar='OUTFILE', default=default_report, help='name of a file to write a report file to (default: {})'.format(default_report))
 
     args = argparser.parse_args()
@@ -37,8 +38,7 @@ def main():
     acc_results = []
 
     for elist_file in args.exps:
-        with open(elist_file, 'r') as infile:
-            elist = ExperimentList.from_json(infile)
+        elist = load_experiment_list(elist_file, cls=CompactExperimentList)
 
         exp_len = len(elist.exps[0].iseq)
 
@@ -0,0 +1,31 @@
+#! /usr/bin/env python3
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import argparse
+import sys
+
+from utils.measurement_store import MeasurementStore
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Inspect or clean up a measurement store database')
+    argparser.add_argument('store', metavar='FILE', help='the measurement store database')
+    argparser.add_argument('--invalidate', metavar='FINGERPRINT', default=None, help='remove all results for the server with this fingerprint')
+    args = argparser.parse_args()
+
+    with MeasurementStore(args.store) as store:
+        if args.invalidate is not None:
+            num = store.invalidate(args.invalidate)
+            print("Removed {} results for server '{}'.".format(num, args.invalidate))
+            if num == 0:
+                sys.exit(1)
+            return
+
+        servers = store.get_servers()
+        print("{} servers with stored results:".format(len(servers)))
+        for fingerprint, description, num, hits in servers:
+            print("  {}: {} results, {} hits ({})".format(fingerprint, num, hits, description))
+
+
+if __name__ == "__main__":
+    main()
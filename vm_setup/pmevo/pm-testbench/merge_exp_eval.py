@@ -2,24 +2,22 @@
 # vim: et:ts=4:sw=4:fenc=utf-8
 
 import argparse
-from utils.experiment import ExperimentList
+from utils.experiment_store import load_experiment_list, store_experiment_list
 
 
 def main():
     argparser = argparse.ArgumentParser(description='Merge the other_result entries of experiment lists with identical experiments')
 
     argparser.add_argument('-o', '--out', metavar="FILE", required=True, help='name for the resulting output experiment list')
-    argparser.add_argument('exps', metavar='FILE', nargs='+', help='input experiment lists in json format')
+    argparser.add_argument('exps', metavar='FILE', nargs='+', help='input experiment lists in json or binary format (by extension)')
 
     args = argparser.parse_args()
 
 
-    with open(args.exps[0], 'r') as infile:
-        elist = ExperimentList.from_json(infile)
+    elist = load_experiment_list(args.exps[0])
 
     for inpath in args.exps[1:]:
-        with open(inpath, 'r') as infile:
-            other_elist = ExperimentList.from_json(infile)
+        other_elist = load_experiment_list(inpath)
         for e, other_e in zip(elist.exps, other_elist.exps):
             for i1, i2 in zip(e.iseq, other_e.iseq):
                 assert i1.name == i2.name
@@ -30,8 +28,7 @@ def main():
                     continue
                 e.other_results.append(r)
 
-    with open(args.out, "w") as outfile:
-        elist.to_json(outfile)
+    store_experiment_list(elist, args.out)
 
 
 if __name__ == "__main__":
@@ -35,3 +35,75 @@ class BottleneckProcessor(SimProcessor):
             max_val = max(max_val, val)
         return float(max_val)
 
+class ZetaBottleneckProcessor(BottleneckProcessor):
+    """ Pure python simulation processor that computes the number of uops
+        contained in every set of ports with a sum-over-subsets dynamic
+        program (zeta transform) in O(P * 2^P) instead of testing every uop
+        against every set of ports.
+    """
+    def __init__(self, mapping: Mapping):
+        super().__init__(mapping)
+        self.num_ports = len(self.port2idx)
+        self.popcounts = [ popcount(q) for q in range(self.max_uop + 1) ]
+
+    def get_description(self):
+        return "simulation processor using the bottleneck algorithm with subset sums (pure python)"
+
+    def cycles_for_weights(self, weights):
+        num_qs = self.max_uop + 1
+
+        # mass[q] is the number of uops that can only be executed on ports in q
+        mass = [0] * num_qs
+        for u, w in weights.items():
+            mass[u] += w
+
+        for x in range(self.num_ports):
+            bit = 1 << x
+            for block in range(0, num_qs, 2 * bit):
+                for q in range(block + bit, block + 2 * bit):
+                    mass[q] += mass[q - bit]
+
+        # find the maximal mass[q] / popcount(q) without building fractions
+        max_mass, max_pc = 0, 1
+        popcounts = self.popcounts
+        for q in range(1, num_qs):
+            if mass[q] * max_pc > max_mass * popcounts[q]:
+                max_mass, max_pc = mass[q], popcounts[q]
+        return float(Fraction(max_mass) / max_pc)
+
+class SparseBottleneckProcessor(BottleneckProcessor):
+    """ Pure python simulation processor that only considers those sets of
+        ports that are unions of the uops occurring in the experiment (the
+        maximum is always reached for one of them).
+        If there are more than max_closure such sets, it falls back to testing
+        all sets of ports.
+    """
+    def __init__(self, mapping: Mapping, max_closure=4096):
+        super().__init__(mapping)
+        self.max_closure = max_closure
+
+    def get_description(self):
+        return "simulation processor using the bottleneck algorithm on unions of uops (pure python)"
+
+    def cycles_for_weights(self, weights):
+        closure = set()
+        for u in weights.keys():
+            if u == 0:
+                # uops without ports are contained in every set of ports
+                return super().cycles_for_weights(weights)
+            closure.update([ q | u for q in closure ])
+            closure.add(u)
+            if len(closure) > self.max_closure:
+                return super().cycles_for_weights(weights)
+
+        max_mass, max_pc = 0, 1
+        for q in closure:
+            mass = 0
+            for u, w in weights.items():
+                if (~q & u) == 0: # all ports of u are contained in q
+                    mass += w
+            pc = popcount(q)
+            if mass * max_pc > max_mass * pc:
+                max_mass, max_pc = mass, pc
+        return float(Fraction(max_mass) / max_pc)
+
@@ -11,13 +11,15 @@ from .sim_processor import SimProcessor
 import sys
 import os
 
+import numpy as np
+
 cppfastproc_path = os.path.join(os.path.dirname(__file__), '../cppfastproc/build')
 sys.path.append(cppfastproc_path)
 
 has_cppfastproc = True
 
 try:
-    from cppfastproc import FP
+    from cppfastproc import FP, Algorithm
 except ImportError:
     has_cppfastproc = False
 
@@ -27,9 +29,29 @@ class CPPBottleneckProcessor(SimProcessor):
     """ Fast, but not so portable simulation processor implementation, uses
         external C++ code.
     """
-    def __init__(self, mapping: Mapping):
+    algorithm = Algorithm.Scan
+    native_backend = True
+
+    def __init__(self, mapping: Mapping, num_threads=1, parallel_threshold=1<<14, max_closure=4096):
+        """ If num_threads is larger than 1, the sets of ports are split over
+            num_threads threads for experiments with at least
+            parallel_threshold sets of ports to consider.
+            max_closure is only used by the CPPSparseBottleneckProcessor.
+        """
         super().__init__(mapping)
-        self.fp = FP(len(self.arch.port_list()))
+        self.fp_args = (len(self.arch.port_list()), self.algorithm, max_closure,
+                num_threads, parallel_threshold)
+        self.fp = FP(*self.fp_args)
+
+    def __getstate__(self):
+        # the C++ object cannot be pickled, it is recreated after unpickling
+        state = super().__getstate__()
+        del state["fp"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.fp = FP(*self.fp_args)
 
     def get_description(self):
         return "simulation processor using the bottleneck algorithm (C++)"
@@ -42,3 +64,88 @@ class CPPBottleneckProcessor(SimProcessor):
 
         return self.fp.compute()
 
+    def cycles_for_weights_list(self, weights_list):
+        offsets = np.zeros(len(weights_list) + 1, dtype=np.int64)
+        for x, weights in enumerate(weights_list):
+            offsets[x + 1] = offsets[x] + len(weights)
+
+        uops = np.fromiter((u for weights in weights_list for u in weights.keys()),
+                dtype=np.uint32, count=offsets[-1])
+        counts = np.fromiter((n for weights in weights_list for n in weights.values()),
+                dtype=np.uint32, count=offsets[-1])
+
+        return self.fp.compute_batch(offsets, uops, counts).tolist()
+
+    def get_table_arrays(self, insns: List[Insn]):
+        """ Get the compiled mapping entries for the list insns of instructions
+            as numpy arrays (offsets, uops, counts) in CSR format, i.e. the
+            entries of insns[x] are at positions offsets[x]:offsets[x+1] of
+            the uops and counts arrays.
+        """
+        entries = [ self.get_insn_entry(i) for i in insns ]
+        offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+        for x, entry in enumerate(entries):
+            offsets[x + 1] = offsets[x] + len(entry)
+        uops = np.fromiter((u for entry in entries for u, n in entry),
+                dtype=np.uint32, count=offsets[-1])
+        counts = np.fromiter((n for entry in entries for u, n in entry),
+                dtype=np.uint32, count=offsets[-1])
+        return (offsets, uops, counts)
+
+    @classmethod
+    def cycles_for_mappings(cls, mappings: List[Mapping], iseqs: List[List[Insn]], **kwargs):
+        """ Compute the number of cycles for each of the instruction lists in
+            iseqs with each of the given mappings, with one call into the C++
+            module for all mappings with the same number of ports.
+            Instructions are identified by name, so the mappings do not need
+            to share their Architecture object. kwargs are passed to the
+            constructor of the processors.
+            Returns a numpy array with one row per mapping and one column per
+            instruction list.
+        """
+        name2id = dict()
+        exp_offsets = np.zeros(len(iseqs) + 1, dtype=np.int64)
+        insn_ids = []
+        for x, iseq in enumerate(iseqs):
+            for i in iseq:
+                insn_ids.append(name2id.setdefault(i.name, len(name2id)))
+            exp_offsets[x + 1] = len(insn_ids)
+        insn_ids = np.array(insn_ids, dtype=np.int64)
+        names = list(name2id.keys())
+
+        # group the mappings by the configuration of their FP object
+        groups = defaultdict(list)
+        for row, m in enumerate(mappings):
+            proc = cls(m, **kwargs)
+            groups[proc.fp_args].append((row, proc))
+
+        res = np.zeros((len(mappings), len(iseqs)), dtype=np.float64)
+        for group in groups.values():
+            tables = [ proc.get_table_arrays([ proc.arch.insns[n] for n in names ])
+                    for row, proc in group ]
+            group_res = group[0][1].fp.compute_mappings(tables, exp_offsets, insn_ids)
+            for (row, proc), cycles in zip(group, group_res):
+                res[row] = cycles
+        return res
+
+class CPPZetaBottleneckProcessor(CPPBottleneckProcessor):
+    """ Variant of the CPPBottleneckProcessor that computes the number of uops
+        contained in every set of ports with a sum-over-subsets dynamic
+        program (zeta transform).
+    """
+    algorithm = Algorithm.SubsetSum
+
+    def get_description(self):
+        return "simulation processor using the bottleneck algorithm with subset sums (C++)"
+
+class CPPSparseBottleneckProcessor(CPPBottleneckProcessor):
+    """ Variant of the CPPBottleneckProcessor that only considers those sets
+        of ports that are unions of the uops occurring in the experiment and
+        falls back to testing all sets of ports if there are more than
+        max_closure of them.
+    """
+    algorithm = Algorithm.Sparse
+
+    def get_description(self):
+        return "simulation processor using the bottleneck algorithm on unions of uops (C++)"
+
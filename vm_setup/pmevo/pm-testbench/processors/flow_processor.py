@@ -0,0 +1,155 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+from abc import ABC, abstractmethod
+from collections import deque
+from fractions import *
+from typing import *
+
+from utils.architecture import Architecture, Insn, Port
+from utils.experiment import Experiment
+from .sim_processor import SimProcessor
+from .bottleneck_processor import popcount
+
+def max_flow(num_nodes, edges, source, sink):
+    """ Compute a maximum flow from source to sink in the graph with nodes
+        0, ..., num_nodes-1 and the list edges of (from, to, capacity) triples
+        with integer capacities (Edmonds-Karp algorithm).
+        Returns the value of the flow and the set of nodes that are reachable
+        from the source in the residual graph, i.e. the source side of a
+        minimum cut.
+    """
+    adj = [ [] for x in range(num_nodes) ]
+    # edge k is stored at index 2*k, its reverse edge at index 2*k+1
+    dest = []
+    cap = []
+    for (a, b, c) in edges:
+        adj[a].append(len(dest))
+        dest.append(b)
+        cap.append(c)
+        adj[b].append(len(dest))
+        dest.append(a)
+        cap.append(0)
+
+    flow = 0
+    while True:
+        pred = [ None ] * num_nodes
+        pred[source] = -1
+        queue = deque([source])
+        while len(queue) > 0 and pred[sink] is None:
+            n = queue.popleft()
+            for e in adj[n]:
+                if cap[e] > 0 and pred[dest[e]] is None:
+                    pred[dest[e]] = e
+                    queue.append(dest[e])
+
+        if pred[sink] is None:
+            reachable = { n for n in range(num_nodes) if pred[n] is not None }
+            return flow, reachable
+
+        # find the bottleneck of the augmenting path and augment the flow
+        path = []
+        n = sink
+        while n != source:
+            e = pred[n]
+            path.append(e)
+            n = dest[e ^ 1]
+        amount = min(cap[e] for e in path)
+        for e in path:
+            cap[e] -= amount
+            cap[e ^ 1] += amount
+        flow += amount
+
+
+class MaxFlowProcessor(SimProcessor):
+    """ Simulation processor that computes the optimal throughput with a
+        sequence of maximum flow problems on the bipartite graph of uops and
+        ports, in polynomial time in the number of ports and uops.
+
+        For a candidate throughput a/b, the uops (scaled by b) can be
+        scheduled with at most a uops per port iff the maximum flow saturates
+        all uops. Otherwise, the minimum cut yields a set of ports with a
+        strictly larger ratio of contained uops per port, which is the next
+        candidate (Dinkelbach's method). All computations are exact.
+    """
+    def __init__(self, mapping: Mapping):
+        super().__init__(mapping)
+
+    def get_description(self):
+        return "simulation processor using maximum flows (pure python)"
+
+    def cycles_for_weights(self, weights):
+        # uops without ports are contained in every (non-empty) set of ports,
+        # like in the bottleneck algorithm
+        portless = sum(w for u, w in weights.items() if u == 0)
+        uops = [ (u, w) for u, w in weights.items() if u != 0 and w > 0 ]
+        if len(uops) == 0:
+            return float(portless)
+
+        if portless > 0:
+            # the best set of ports might contain ports without uops
+            ports = list(range(len(self.port2idx)))
+        else:
+            ports = sorted({ x for u, w in uops for x in range(u.bit_length()) if (u >> x) & 1 })
+        num_uops = len(uops)
+        num_nodes = num_uops + len(ports) + 2
+        source = num_nodes - 2
+        sink = num_nodes - 1
+        port_node = { x: num_uops + n for n, x in enumerate(ports) }
+
+        total = sum(w for u, w in uops)
+
+        def mass(q):
+            return sum(w for u, w in uops if (~q & u) == 0) + portless
+
+        def min_cut_ports(a, b, forced=None):
+            """ Find a set of ports q (containing the port forced) that
+                maximizes b * (mass of uops in q) - a * |q|. Returns q and
+                whether all uops are saturated.
+            """
+            inf = total * b + a * len(ports) + 1
+            edges = []
+            for n, (u, w) in enumerate(uops):
+                edges.append((source, n, w * b))
+                for x in ports:
+                    if (u >> x) & 1:
+                        edges.append((n, port_node[x], inf))
+            for x in ports:
+                edges.append((port_node[x], sink, a))
+            if forced is not None:
+                edges.append((source, port_node[forced], inf))
+
+            flow, reachable = max_flow(num_nodes, edges, source, sink)
+            q = 0
+            for x in ports:
+                if port_node[x] in reachable:
+                    q |= 1 << x
+            return q, flow == total * b
+
+        # start with the ratio for the set of all used ports
+        q = 0
+        for u, w in uops:
+            q |= u
+        val = Fraction(mass(q), popcount(q))
+
+        while True:
+            a, b = val.numerator, val.denominator
+            if portless == 0:
+                q, saturated = min_cut_ports(a, b)
+                if saturated:
+                    return float(val)
+            else:
+                # the mass of the portless uops only counts for non-empty
+                # sets of ports, so look for the best set containing each
+                # port
+                for x in ports:
+                    q, saturated = min_cut_ports(a, b, forced=x)
+                    if mass(q) * b > a * popcount(q):
+                        break
+                else:
+                    return float(val)
+
+            # the ports on the source side of the minimum cut have a larger
+            # ratio of contained uops per port
+            new_val = Fraction(mass(q), popcount(q))
+            assert new_val > val
+            val = new_val
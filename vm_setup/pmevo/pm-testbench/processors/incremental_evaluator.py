@@ -0,0 +1,103 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+from collections import defaultdict
+from typing import *
+
+from utils.architecture import Architecture, Insn, Port
+from utils.experiment import Experiment, ExperimentList
+from .sim_processor import SimProcessor
+
+class IncrementalEvaluator:
+    """ Keeps the simulated cycles of a list of experiments with measured
+        results up to date while single instructions of the mapping of a
+        SimProcessor are changed.
+
+        An inverted index from instructions to the experiments containing them
+        and the uop weights of every experiment are kept, so that changing the
+        assignment of an instruction only requires recomputing the cycles of
+        the experiments that contain it.
+
+        The fitness is the mean relative error of the simulated cycles wrt.
+        the measured cycles (lower is better). Experiments without positive
+        measured cycles have no relative error, they are left out and kept
+        in the skipped list.
+    """
+    def __init__(self, proc: SimProcessor, exps: ExperimentList):
+        self.proc = proc
+        self.mapping = proc.mapping
+        self.exps = []
+        self.skipped = []
+        for e in exps:
+            if e.result is None or e.get_cycles() is None or not e.get_cycles() > 0:
+                self.skipped.append(e)
+            else:
+                self.exps.append(e)
+
+        # map instructions to lists of (experiment index, number of occurrences)
+        self.insn_index = defaultdict(list)
+        for x, e in enumerate(self.exps):
+            for i, n in e.items():
+                self.insn_index[i].append((x, n))
+
+        self.measured = [ e.get_cycles() for e in self.exps ]
+        self.weights = [ proc.get_weights_for_items(e.items()) for e in self.exps ]
+        self.cycles = proc.evaluate_weights_list(self.weights)
+        self.errors = [ self.rel_error(x, c) for x, c in enumerate(self.cycles) ]
+        self.total_error = sum(self.errors)
+
+    def rel_error(self, x, cycles):
+        measured = self.measured[x]
+        return abs(cycles - measured) / measured
+
+    def get_fitness(self):
+        if len(self.exps) == 0:
+            return 0.0
+        return self.total_error / len(self.exps)
+
+    def get_cycles(self, exp_idx):
+        return self.cycles[exp_idx]
+
+    def affected_exps(self, insn: Insn):
+        """ Get the indices of the experiments that contain insn.
+        """
+        return [ x for x, n in self.insn_index.get(insn, []) ]
+
+    def update(self, insn: Insn, new_value):
+        """ Set the assignment of insn in the mapping to new_value (a list of
+            uops for a Mapping3, a list of ports for a Mapping2), recompute the
+            affected experiments and return the change of the fitness.
+        """
+        old_fitness = self.get_fitness()
+
+        old_entry = self.proc.get_insn_entry(insn)
+        self.mapping.assignment[insn] = new_value
+        new_entry = self.proc.get_insn_entry(insn)
+
+        affected = self.insn_index.get(insn, [])
+        for x, n in affected:
+            weights = self.weights[x]
+            for u, k in old_entry:
+                weights[u] -= n * k
+                if weights[u] == 0:
+                    del weights[u]
+            for u, k in new_entry:
+                weights[u] += n * k
+
+        new_cycles = self.proc.evaluate_weights_list([ self.weights[x] for x, n in affected ])
+        for (x, n), cycles in zip(affected, new_cycles):
+            self.cycles[x] = cycles
+            err = self.rel_error(x, cycles)
+            self.total_error += err - self.errors[x]
+            self.errors[x] = err
+
+        return self.get_fitness() - old_fitness
+
+    def recompute(self):
+        """ Recompute everything from scratch, e.g. after changing the mapping
+            without update() or to get rid of accumulated rounding errors in
+            the fitness.
+        """
+        skipped = self.skipped
+        self.__init__(self.proc, self.exps)
+        self.skipped = skipped
+
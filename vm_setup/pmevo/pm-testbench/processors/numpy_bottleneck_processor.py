@@ -0,0 +1,70 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+from abc import ABC, abstractmethod
+from typing import *
+
+import numpy as np
+
+from utils.architecture import Architecture, Insn, Port
+from utils.experiment import Experiment
+from .sim_processor import SimProcessor
+
+class NumpyBottleneckProcessor(SimProcessor):
+    """ Simulation processor that evaluates the bottleneck algorithm for many
+        experiments at once with vectorized numpy operations.
+
+        The experiments are turned into a matrix of uop counts (experiments x
+        distinct uops) that is multiplied with a matrix that indicates which
+        uop is contained in which port set. All operands are integers that
+        are represented exactly in floating point, so the results are
+        identical to those of the other bottleneck processors.
+    """
+    native_backend = True
+
+    def __init__(self, mapping: Mapping, block_size=1<<22):
+        super().__init__(mapping)
+        # maximal number of matrix elements to compute at once
+        self.block_size = block_size
+
+        self.qs = np.arange(1, self.max_uop + 1, dtype=np.int64)
+        pcs = np.zeros(len(self.qs), dtype=np.float64)
+        for x in range(len(self.port2idx)):
+            pcs += (self.qs >> x) & 1
+        self.popcounts = pcs
+
+    def get_description(self):
+        return "simulation processor using the bottleneck algorithm (vectorized numpy)"
+
+    def cycles_for_weights(self, weights):
+        return self.cycles_for_weights_list([weights])[0]
+
+    def cycles_for_weights_list(self, weights_list):
+        masks = sorted({ u for weights in weights_list for u in weights.keys() })
+        mask2idx = { u: x for x, u in enumerate(masks) }
+
+        counts = np.zeros((len(weights_list), len(masks)), dtype=np.float64)
+        for row, weights in enumerate(weights_list):
+            for u, n in weights.items():
+                counts[row, mask2idx[u]] = n
+
+        masks = np.array(masks, dtype=np.int64)
+
+        num_exps = len(weights_list)
+        num_qs = len(self.qs)
+        q_step = max(1, min(num_qs, self.block_size // max(1, len(masks))))
+        e_step = max(1, self.block_size // q_step)
+
+        res = np.zeros(num_exps, dtype=np.float64)
+        for q_start in range(0, num_qs, q_step):
+            qs = self.qs[q_start:q_start + q_step]
+            pcs = self.popcounts[q_start:q_start + q_step]
+            # contained[u, q] is 1 iff all ports of u are contained in q
+            contained = ((masks[:, None] & ~qs[None, :]) == 0).astype(np.float64)
+            for e_start in range(0, num_exps, e_step):
+                vals = counts[e_start:e_start + e_step] @ contained
+                vals /= pcs
+                np.maximum(res[e_start:e_start + e_step], vals.max(axis=1),
+                        out=res[e_start:e_start + e_step])
+
+        return res.tolist()
+
@@ -3,11 +3,52 @@
 from abc import ABC, abstractmethod
 from typing import *
 from time import sleep
+import os
+import math
+import multiprocessing
+import pickle
 import random
 
 from utils.architecture import Architecture, Insn, Port
 from utils.experiment import Experiment, ExperimentList
 
+# the processor used in worker processes of Processor.execute_parallel
+_worker_proc = None
+
+def _init_worker(proc_data):
+    # the processor is passed pickled, so that workers get the same state
+    # with every start method (fork, spawn or forkserver)
+    global _worker_proc
+    _worker_proc = pickle.loads(proc_data)
+
+def _rebuild_wrapped(base_cls, wrappers, state):
+    """ Recreate a processor of a class created by (a chain of) make_delayed
+        and make_jittered calls, which cannot be pickled by reference.
+    """
+    cls = base_cls
+    for w in reversed(wrappers):
+        cls = getattr(cls, "make_" + w)()
+    res = cls.__new__(cls)
+    if hasattr(res, "__setstate__"):
+        res.__setstate__(state)
+    else:
+        res.__dict__.update(state)
+    return res
+
+def _reduce_wrapped(proc):
+    cls = type(proc)
+    wrappers = []
+    while "wrapper_kind" in cls.__dict__:
+        wrappers.append(cls.wrapper_kind)
+        cls = cls.__bases__[0]
+    getstate = getattr(proc, "__getstate__", None)
+    state = proc.__dict__.copy() if getstate is None else getstate()
+    return (_rebuild_wrapped, (cls, wrappers, state))
+
+def _execute_chunk(args):
+    iseqs, kwargs = args
+    return _worker_proc.execute_many(iseqs, **kwargs)
+
 class Processor(ABC):
     @staticmethod
     def class_for_name(name: str):
@@ -18,12 +59,33 @@ class Processor(ABC):
         if lname == "bottleneck":
             import processors.bottleneck_processor
             return processors.bottleneck_processor.BottleneckProcessor
+        elif lname == "zetabottleneck":
+            import processors.bottleneck_processor
+            return processors.bottleneck_processor.ZetaBottleneckProcessor
+        elif lname == "sparsebottleneck":
+            import processors.bottleneck_processor
+            return processors.bottleneck_processor.SparseBottleneckProcessor
         elif lname == "cppbottleneck":
             import processors.cpp_bottleneck_processor
             return processors.cpp_bottleneck_processor.CPPBottleneckProcessor
+        elif lname == "cppzetabottleneck":
+            import processors.cpp_bottleneck_processor
+            return processors.cpp_bottleneck_processor.CPPZetaBottleneckProcessor
+        elif lname == "cppsparsebottleneck":
+            import processors.cpp_bottleneck_processor
+            return processors.cpp_bottleneck_processor.CPPSparseBottleneckProcessor
         elif lname == "lp":
             import processors.lp_processor
             return processors.lp_processor.LPProcessor
+        elif lname == "scipylp":
+            import processors.scipy_lp_processor
+            return processors.scipy_lp_processor.ScipyLPProcessor
+        elif lname == "maxflow":
+            import processors.flow_processor
+            return processors.flow_processor.MaxFlowProcessor
+        elif lname == "numpybottleneck":
+            import processors.numpy_bottleneck_processor
+            return processors.numpy_bottleneck_processor.NumpyBottleneckProcessor
         # TODO insert new processors
         elif lname.startswith("delayed"):
             base_cls = Processor.class_for_name(lname[len("delayed"):])
@@ -63,22 +125,62 @@ class Processor(ABC):
         res = self.execute(iseq)
         return res['cycles']
 
+    def execute_many(self, iseqs: List[List[Insn]], **kwargs) -> List[Dict[str, float]]:
+        """ Return a list with the execution results (as returned by execute)
+            for each of the instruction lists in iseqs, in the same order.
+            Processors that can evaluate many experiments at once more
+            efficiently than one by one should override this.
+        """
+        return [ self.execute(iseq, **kwargs) for iseq in iseqs ]
+
+    def execute_parallel(self, iseqs: List[List[Insn]], jobs=None, chunk_size=None, **kwargs) -> List[Dict[str, float]]:
+        """ Like execute_many, but distribute the experiments in chunks of
+            chunk_size experiments over jobs worker processes (default: one
+            per CPU). Each worker receives this processor once at startup.
+        """
+        if jobs is None:
+            jobs = os.cpu_count()
+        iseqs = list(iseqs)
+        if jobs <= 1 or len(iseqs) <= 1:
+            return self.execute_many(iseqs, **kwargs)
+        if chunk_size is None:
+            # a few chunks per worker for balancing the load
+            chunk_size = math.ceil(len(iseqs) / (4 * jobs))
+
+        chunks = [ (iseqs[start:start + chunk_size], kwargs) for start in range(0, len(iseqs), chunk_size) ]
+
+        res = []
+        with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(pickle.dumps(self),)) as pool:
+            # imap preserves the order of the chunks
+            for chunk_res in pool.imap(_execute_chunk, chunks):
+                res += chunk_res
+        return res
+
     def eval(self, exp: Experiment):
         """ Evaluate the given experiment and insert the results.
         """
         res = self.execute(exp.iseq)
         exp.result = res
 
-    def eval_list(self, exps: ExperimentList):
+    def eval_list(self, exps: ExperimentList, jobs=1, chunk_size=None):
         """ Evaluate the given ExperimentList and insert the results.
+            If jobs is not 1, the experiments are evaluated in parallel (see
+            execute_parallel).
         """
-        for e in exps:
-            self.eval(e)
+        iseqs = [ e.iseq for e in exps ]
+        if jobs == 1:
+            results = self.execute_many(iseqs)
+        else:
+            results = self.execute_parallel(iseqs, jobs=jobs, chunk_size=chunk_size)
+        for e, res in zip(exps, results):
+            e.result = res
 
 
     @classmethod
     def make_delayed(cls):
         class DelayedProcessor(cls):
+            wrapper_kind = "delayed"
+
             def __init__(self, *args, **kwargs):
                 if "delay" in kwargs:
                     self.delay = kwargs["delay"]
@@ -92,6 +194,9 @@ class Processor(ABC):
                 res = "delayed processor wrapping a ({}) with a delay of {} ms".format(super_desc, self.delay)
                 return res
 
+            def __reduce__(self):
+                return _reduce_wrapped(self)
+
             def execute(self, iseq: List[Insn]) -> Dict[str, float]:
                 sleep(self.delay / 1000)
                 return super().execute(iseq)
@@ -100,11 +205,17 @@ class Processor(ABC):
                 sleep(self.delay / 1000)
                 return super().get_cycles(iseq)
 
+            def execute_many(self, iseqs: List[List[Insn]], **kwargs) -> List[Dict[str, float]]:
+                # delay every single experiment
+                return [ self.execute(iseq, **kwargs) for iseq in iseqs ]
+
         return DelayedProcessor
 
     @classmethod
     def make_jittered(cls):
         class JitteredProcessor(cls):
+            wrapper_kind = "jittered"
+
             def __init__(self, *args, **kwargs):
                 if "jitter" in kwargs:
                     self.jitter = kwargs["jitter"]
@@ -118,6 +229,9 @@ class Processor(ABC):
                 res = "jittered processor wrapping a ({}) with a jitter of {} cycles".format(super_desc, self.jitter)
                 return res
 
+            def __reduce__(self):
+                return _reduce_wrapped(self)
+
             def execute(self, iseq: List[Insn]) -> Dict[str, float]:
                 res = super().execute(iseq)
                 jitter = random.uniform(-self.jitter, self.jitter)
@@ -130,5 +244,9 @@ class Processor(ABC):
                 res += jitter
                 return res
 
+            def execute_many(self, iseqs: List[List[Insn]], **kwargs) -> List[Dict[str, float]]:
+                # jitter every single experiment
+                return [ self.execute(iseq, **kwargs) for iseq in iseqs ]
+
         return JitteredProcessor
 
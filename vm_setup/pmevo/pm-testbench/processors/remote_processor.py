@@ -1,9 +1,11 @@
 # vim: et:ts=4:sw=4:fenc=utf-8
 
 from abc import ABC, abstractmethod
+import time
 from typing import *
 
 from utils.architecture import Architecture, Insn, Port
+from utils.measurement_store import MeasurementStore, compute_fingerprint
 from .processor import Processor
 
 import rpyc
@@ -17,18 +19,103 @@ def unwrap_netref(o):
     else:
         return o
 
+class ConnectionPool:
+    """ Pool of idle connections that are reused instead of opening a new
+        connection for every request.
+        Connections that have been idle for more than health_check_interval
+        seconds are checked with a ping before they are handed out and
+        replaced if they are broken.
+    """
+    def __init__(self, factory, max_idle=2, health_check_interval=30.0):
+        self.factory = factory
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        # list of (connection, time of last use) pairs
+        self.idle = []
+        self.num_connects = 0
+
+    def connect(self):
+        self.num_connects += 1
+        return self.factory()
+
+    def is_healthy(self, c, last_used):
+        if c.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            c.ping()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        while len(self.idle) > 0:
+            c, last_used = self.idle.pop()
+            if self.is_healthy(c, last_used):
+                return c
+            self.discard(c)
+        return self.connect()
+
+    def release(self, c):
+        if c.closed or len(self.idle) >= self.max_idle:
+            self.discard(c)
+            return
+        self.idle.append((c, time.monotonic()))
+
+    def discard(self, c):
+        try:
+            c.close()
+        except Exception:
+            pass
+
+    def close(self):
+        for c, last_used in self.idle:
+            self.discard(c)
+        self.idle.clear()
+
+    def call(self, fun):
+        """ Call fun with a connection from the pool and return its result.
+            If the connection turns out to be broken, the call is retried
+            once with a new connection. Connections are discarded if fun
+            raises an exception, since they might still receive a reply.
+        """
+        for attempt in range(2):
+            c = self.acquire()
+            try:
+                res = fun(c)
+            except (EOFError, ConnectionError):
+                self.discard(c)
+                if attempt > 0:
+                    raise
+                continue
+            except BaseException:
+                self.discard(c)
+                raise
+            self.release(c)
+            return res
+
+
 class RemoteProcessor(Processor):
     """
         Implementation of the processor interface that executes the experiments
         on a server running on a remote machine.
+        If a MeasurementStore is given, results for experiments that have
+        already been measured with the same server and parameters are taken
+        from the store instead of measuring them again.
+        execute_many sends up to batch_size experiments per request.
     """
-    def __init__(self, hostname, port=42424, sslpath=".", filter_list=[], request_timeout=30):
+    def __init__(self, hostname, port=42424, sslpath=".", filter_list=[], request_timeout=30, store: MeasurementStore = None, batch_size=16):
         self.hostname = hostname
         self.port = port
         self.keyfile = sslpath + "/key.pem"
         self.certfile = sslpath + "/cert.pem"
         self.request_timeout = request_timeout
-        c = self.conn()
+        self.batch_size = batch_size
+        # set to False if the server does not provide run_experiments
+        self.batch_supported = True
+        self.pool = ConnectionPool(self.conn)
+        c = self.pool.acquire()
 
         insn_ids = c.root.get_insns()
 
@@ -49,7 +136,27 @@ class RemoteProcessor(Processor):
         remote_description = c.root.get_description()
         self.remote_description = remote_description
 
-        c.close()
+        self.pool.release(c)
+
+        self.fingerprint = compute_fingerprint(remote_description, [ i.name for i in self.arch.insn_list() ], num_ports)
+        self.store = store
+        if store is not None:
+            store.register_server(self.fingerprint, remote_description)
+
+    def __getstate__(self):
+        # connections cannot be pickled
+        state = self.__dict__.copy()
+        state["pool"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.pool = ConnectionPool(self.conn)
+
+    def close(self):
+        """ Close all idle connections to the server.
+        """
+        self.pool.close()
 
     def conn(self):
         return rpyc.ssl_connect(
@@ -65,24 +172,88 @@ class RemoteProcessor(Processor):
 
     def gen_code(self, iseq, **kwargs):
         exp = [self.insn_dict[i] for i in iseq]
-        c = self.conn()
-        remote_res = c.root.gen_code(exp, **kwargs)
-        res = unwrap_netref(remote_res)
-        return res
+        # unwrap netref before releasing the connection
+        return self.pool.call(lambda c: unwrap_netref(c.root.gen_code(exp, **kwargs)))
 
     def execute(self, iseq: List[Insn], **kwargs) -> Dict[str, float]:
+        if self.store is not None:
+            names = [ i.name for i in iseq ]
+            res = self.store.lookup(self.fingerprint, names, kwargs)
+            if res is None:
+                res = self.execute_remote(iseq, **kwargs)
+                self.store.insert(self.fingerprint, names, kwargs, res)
+            return res
+        return self.execute_remote(iseq, **kwargs)
+
+    def execute_remote(self, iseq: List[Insn], **kwargs) -> Dict[str, float]:
         exp = [self.insn_dict[i] for i in iseq]
-        c = self.conn()
         try:
-            remote_res = c.root.run_experiment(exp, **kwargs)
-            # unwrap netref before closing the connection
-            res = unwrap_netref(remote_res)
+            # unwrap netref before releasing the connection
+            res = self.pool.call(lambda c: unwrap_netref(c.root.run_experiment(exp, **kwargs)))
         except rpyc.AsyncResultTimeout:
+            # the connection has been discarded by the pool
             res = {'cycles': None, 'error_cause': 'connection timeout'}
-        finally:
-            c.close()
         return res
 
+    def execute_many(self, iseqs: List[List[Insn]], **kwargs) -> List[Dict[str, float]]:
+        iseqs = list(iseqs)
+        results = [ None ] * len(iseqs)
+
+        todo = []
+        for x, iseq in enumerate(iseqs):
+            if self.store is not None:
+                results[x] = self.store.lookup(self.fingerprint, [ i.name for i in iseq ], kwargs)
+            if results[x] is None:
+                todo.append(x)
+
+        for start in range(0, len(todo), self.batch_size):
+            batch = todo[start:start + self.batch_size]
+            batch_results = self.execute_remote_many([ iseqs[x] for x in batch ], **kwargs)
+            for x, res in zip(batch, batch_results):
+                results[x] = res
+                if self.store is not None:
+                    self.store.insert(self.fingerprint, [ i.name for i in iseqs[x] ], kwargs, res)
+
+        return results
+
+    def execute_remote_many(self, iseqs: List[List[Insn]], **kwargs) -> List[Dict[str, float]]:
+        """ Run the experiments in iseqs on the server with a single request.
+            Results are streamed back as the experiments finish, so that
+            results obtained before a timeout are kept.
+        """
+        if not self.batch_supported:
+            return [ self.execute_remote(iseq, **kwargs) for iseq in iseqs ]
+
+        # tuples are passed by value
+        exps = tuple(tuple(self.insn_dict[i] for i in iseq) for iseq in iseqs)
+        results = [ None ] * len(exps)
+
+        def callback(x, remote_res):
+            results[x] = unwrap_netref(remote_res)
+
+        def run(c):
+            try:
+                fun = c.root.run_experiments
+            except AttributeError:
+                return False
+            async_res = rpyc.async_(fun)(exps, callback=callback, **kwargs)
+            async_res.set_expiry(self.request_timeout * len(exps))
+            async_res.wait()
+            # raise remote exceptions
+            async_res.value
+            return True
+
+        try:
+            if not self.pool.call(run):
+                # older servers only support single experiments
+                self.batch_supported = False
+                return self.execute_remote_many(iseqs, **kwargs)
+        except rpyc.AsyncResultTimeout:
+            # the connection has been discarded by the pool
+            pass
+
+        return [ res if res is not None else {'cycles': None, 'error_cause': 'connection timeout'} for res in results ]
+
     def get_arch(self):
         return self.arch
 
@@ -0,0 +1,146 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+from abc import ABC, abstractmethod
+from typing import *
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+
+from utils.architecture import Architecture, Insn, Port
+from utils.experiment import Experiment
+from .sim_processor import SimProcessor
+
+class ScipyLPProcessor(SimProcessor):
+    """ Simulation processor using an LP solved by HiGHS (via scipy) for
+        computing cycle numbers. Unlike the LPProcessor, this requires no
+        solver license.
+
+        The constraint matrix is built once for all uops of the mapping, only
+        the right-hand sides (the number of occurrences of each uop) differ
+        between experiments. Lists of experiments are solved in batches of
+        batch_size experiments as one block-diagonal LP.
+    """
+    def __init__(self, mapping: Mapping, batch_size=64):
+        super().__init__(mapping)
+        self.batch_size = batch_size
+        self.lp_version = None
+
+    def get_description(self):
+        return "simulation processor using an LP solved by HiGHS (via scipy)"
+
+    def build_lp(self):
+        """ Build the LP skeleton for the current state of the mapping.
+            There are variables x[u, p] for each uop u of the mapping and each
+            port p that u can be executed on, and a final variable for the
+            number of cycles.
+        """
+        table = self.get_insn_table()
+        if self.lp_version == self.table_version:
+            return
+
+        masks = set()
+        for i, idx in self.insn2idx.items():
+            if table[idx] is None and i in self.mapping.assignment:
+                table[idx] = self.compile_insn(i)
+            if table[idx] is not None:
+                masks.update(u for u, n in table[idx])
+        # uops without ports are handled without the LP
+        masks.discard(0)
+        masks = sorted(masks)
+
+        num_ports = len(self.port2idx)
+        eq_rows, eq_cols = [], []
+        ub_rows, ub_cols = [], []
+        num_vars = 0
+        for row, u in enumerate(masks):
+            for p in range(num_ports):
+                if (u >> p) & 1:
+                    # each uop is executed exactly n times...
+                    eq_rows.append(row)
+                    eq_cols.append(num_vars)
+                    # ...and contributes to the load of its ports
+                    ub_rows.append(p)
+                    ub_cols.append(num_vars)
+                    num_vars += 1
+        lat_var = num_vars
+        num_vars += 1
+
+        # the load of each port is bounded by the number of cycles
+        ub_vals = [ 1.0 ] * len(ub_rows)
+        for p in range(num_ports):
+            ub_rows.append(p)
+            ub_cols.append(lat_var)
+            ub_vals.append(-1.0)
+
+        self.lp_masks = { u: x for x, u in enumerate(masks) }
+        self.lp_num_vars = num_vars
+        self.lp_lat_var = lat_var
+        self.lp_A_eq = sp.csr_matrix((np.ones(len(eq_rows)), (eq_rows, eq_cols)),
+                shape=(len(masks), num_vars))
+        self.lp_A_ub = sp.csr_matrix((ub_vals, (ub_rows, ub_cols)),
+                shape=(num_ports, num_vars))
+        self.lp_batch = dict()
+        self.lp_version = self.table_version
+
+    def get_batch_lp(self, num):
+        """ Get the block-diagonal constraint matrices for num experiments.
+        """
+        res = self.lp_batch.get(num, None)
+        if res is None:
+            A_eq = sp.block_diag([ self.lp_A_eq ] * num, format="csr")
+            A_ub = sp.block_diag([ self.lp_A_ub ] * num, format="csr")
+            c = np.zeros(num * self.lp_num_vars)
+            c[self.lp_lat_var::self.lp_num_vars] = 1.0
+            res = (c, A_ub, A_eq)
+            self.lp_batch[num] = res
+        return res
+
+    def cycles_for_weights(self, weights):
+        return self.cycles_for_weights_list([weights])[0]
+
+    def cycles_for_weights_list(self, weights_list):
+        self.build_lp()
+
+        # uops without ports cannot be scheduled in the LP, as in the
+        # bottleneck algorithm they are contained in every set of ports
+        res = [ None ] * len(weights_list)
+        lp_exps = []
+        port_sizes = [ 1 ] * len(self.port2idx)
+        for x, weights in enumerate(weights_list):
+            if weights.get(0, 0) > 0:
+                res[x] = self.cycles_for_reduced_weights(weights, port_sizes)
+            else:
+                lp_exps.append(x)
+
+        for x, cycles in zip(lp_exps, self.solve_lps([ weights_list[x] for x in lp_exps ])):
+            res[x] = cycles
+        return res
+
+    def solve_lps(self, weights_list):
+        """ Compute the number of cycles for the weights dictionaries in
+            weights_list (with only uops that have ports) with the LP.
+        """
+        num_masks = len(self.lp_masks)
+        res = []
+        for start in range(0, len(weights_list), self.batch_size):
+            batch = weights_list[start:start + self.batch_size]
+            num = len(batch)
+
+            b_eq = np.zeros(num * num_masks)
+            for x, weights in enumerate(batch):
+                for u, n in weights.items():
+                    if u != 0:
+                        b_eq[x * num_masks + self.lp_masks[u]] = n
+            b_ub = np.zeros(num * len(self.port2idx))
+
+            c, A_ub, A_eq = self.get_batch_lp(num)
+            sol = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
+                    bounds=(0, None), method="highs")
+
+            assert sol.status == 0, "LP solving failed: {}".format(sol.message)
+
+            res += sol.x[self.lp_lat_var::self.lp_num_vars].tolist()
+
+        return res
+
@@ -1,16 +1,21 @@
 # vim: et:ts=4:sw=4:fenc=utf-8
 
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from fractions import Fraction
 from typing import *
 
 from utils.architecture import Architecture, Insn, Port
-from utils.experiment import Experiment
+from utils.experiment import Experiment, ExperimentList
 from utils.mapping import *
 
 from .processor import Processor
 
 class SimProcessor(Processor):
+    # True for processors whose cycles_for_weights_list is implemented in
+    # native code, port reduction would only replace it with slower Python
+    native_backend = False
+
     def __init__(self, mapping: Mapping):
         self.arch = mapping.arch
         self.mapping = mapping
@@ -22,6 +27,145 @@ class SimProcessor(Processor):
 
         self.max_uop = self.uop2bv(all_ports)
 
+        # optional cache for cycle numbers of experiments, see enable_cache
+        self.cache = None
+        self.cache_max_size = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # optional reduction of equivalent ports, see enable_port_reduction
+        self.port_reduction = False
+        self.num_reduction_exps = 0
+        self.num_effective_ports = 0
+
+        all_insns = sorted(self.arch.insns.values())
+        self.insn2idx = dict()
+        for x, i in enumerate(all_insns):
+            self.insn2idx[i] = x
+
+        self.compile_mapping()
+
+    def compile_mapping(self):
+        """ Compute the table that maps the index of each instruction to a
+            tuple of (uop bitvector, number of occurrences) pairs.
+            Entries are computed lazily after the mapping has changed (which
+            includes in-place modifications of its uop lists, see Mapping).
+        """
+        self.insn_table = [ None ] * len(self.insn2idx)
+        self.table_version = self.mapping.version
+        for i in self.mapping.assignment.keys():
+            idx = self.insn2idx.get(i, None)
+            if idx is not None:
+                self.insn_table[idx] = self.compile_insn(i)
+
+    def compile_insn(self, insn: Insn):
+        """ Compute the insn_table entry for the instruction insn.
+        """
+        entry = defaultdict(lambda : 0)
+        if isinstance(self.mapping, MaskMapping):
+            # the bits of the masks correspond to the port indices
+            for m in self.mapping.assignment[insn]:
+                entry[m] += 1
+        elif isinstance(self.mapping, Mapping3):
+            for u in self.mapping.assignment[insn]:
+                entry[self.uop2bv(u)] += 1
+        elif isinstance(self.mapping, Mapping2):
+            entry[self.uop2bv(self.mapping.assignment[insn])] += 1
+        else:
+            raise NotImplementedError("compile_insn")
+        return tuple(entry.items())
+
+    def get_insn_entry(self, insn: Insn):
+        """ Get the tuple of (uop bitvector, number of occurrences) pairs for
+            insn in the current state of the mapping.
+        """
+        table = self.get_insn_table()
+        idx = self.insn2idx[insn]
+        entry = table[idx]
+        if entry is None:
+            entry = self.compile_insn(insn)
+            table[idx] = entry
+        return entry
+
+    def get_insn_table(self):
+        """ Get the insn_table for the current state of the mapping.
+        """
+        if self.table_version != self.mapping.version:
+            self.insn_table = [ None ] * len(self.insn2idx)
+            self.table_version = self.mapping.version
+            if self.cache is not None:
+                self.cache.clear()
+        return self.insn_table
+
+    def enable_cache(self, max_size=1<<16):
+        """ Cache the cycle numbers of up to max_size distinct experiments
+            (with least recently used eviction). Experiments are identified by
+            their multiset of instructions. The cache is cleared whenever the
+            mapping is changed.
+        """
+        assert max_size > 0
+        self.cache = OrderedDict()
+        self.cache_max_size = max_size
+
+    def disable_cache(self):
+        self.cache = None
+        self.cache_max_size = 0
+
+    def enable_port_reduction(self):
+        """ Before computing the cycles for an experiment, collapse ports that
+            can execute exactly the same of the experiment's uops into a single
+            port with the combined throughput, and drop unused ports.
+            The results are unchanged, but the number of ports to consider
+            can shrink considerably.
+            The reduced experiments are evaluated in Python, so this has no
+            effect for processors with a native_backend.
+        """
+        self.port_reduction = True
+
+    def disable_port_reduction(self):
+        self.port_reduction = False
+
+    def get_stats(self):
+        """ Get a dictionary with statistics about the work of the processor.
+        """
+        res = dict()
+        if self.cache is not None:
+            res["cache_hits"] = self.cache_hits
+            res["cache_misses"] = self.cache_misses
+            res["cache_entries"] = len(self.cache)
+        if self.port_reduction and not self.native_backend:
+            res["num_ports"] = len(self.port2idx)
+            res["num_reduction_exps"] = self.num_reduction_exps
+            if self.num_reduction_exps > 0:
+                res["avg_effective_ports"] = self.num_effective_ports / self.num_reduction_exps
+        return res
+
+    def cache_key(self, iseq: List[Insn]):
+        return tuple(sorted(self.insn2idx[i] for i in iseq))
+
+    def cache_lookup(self, key):
+        res = self.cache.get(key, None)
+        if res is None:
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+        return res
+
+    def cache_insert(self, key, cycles):
+        self.cache[key] = cycles
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_max_size:
+            self.cache.popitem(last=False)
+
+    def __getstate__(self):
+        # derived data is recomputed after unpickling
+        state = self.__dict__.copy()
+        state["insn_table"] = [ None ] * len(self.insn2idx)
+        if self.cache is not None:
+            state["cache"] = OrderedDict()
+        return state
+
     def uop2bv(self, u):
         """ Compute a bitvector representing the list p of ports.
         """
@@ -33,18 +177,187 @@ class SimProcessor(Processor):
     def get_arch(self):
         return self.arch
 
-    def get_cycles(self, iseq: List[Insn]) -> float:
+    def get_weights(self, iseq: List[Insn]):
+        """ Compute the dictionary that maps the bitvector representations of
+            the uops of the instructions in iseq to their number of occurrences.
+        """
+        table = self.get_insn_table()
         weights = defaultdict(lambda : 0)
-        if isinstance(self.mapping, Mapping3):
-            for i in iseq:
-                for u in self.mapping.assignment[i]:
-                    weights[self.uop2bv(u)] += 1
-        elif isinstance(self.mapping, Mapping2):
-            for i in iseq:
-                weights[self.uop2bv(self.mapping.assignment[i])] += 1
-        else:
-            raise NotImplementedError("get_cycles")
-        return self.cycles_for_weights(weights)
+        for i in iseq:
+            # inlined version of get_insn_entry
+            idx = self.insn2idx[i]
+            entry = table[idx]
+            if entry is None:
+                entry = self.compile_insn(i)
+                table[idx] = entry
+            for u, n in entry:
+                weights[u] += n
+        return weights
+
+    def get_weights_for_items(self, items):
+        """ Like get_weights, but for an iterable of (instruction, number of
+            occurrences) pairs, e.g. from Experiment.items().
+        """
+        table = self.get_insn_table()
+        weights = defaultdict(lambda : 0)
+        for i, k in items:
+            idx = self.insn2idx[i]
+            entry = table[idx]
+            if entry is None:
+                entry = self.compile_insn(i)
+                table[idx] = entry
+            for u, n in entry:
+                weights[u] += n * k
+        return weights
+
+    def reduce_ports(self, weights):
+        """ Collapse the ports that are contained in exactly the same uops of
+            weights and drop unused ports.
+            Returns a pair of the weights for the collapsed ports and a list
+            with the number of original ports for each collapsed port, or None
+            if no ports can be collapsed or dropped.
+        """
+        masks = list(weights.keys())
+        if 0 in masks:
+            # uops without ports are contained in every set of ports
+            return None
+
+        # group ports by the set of uops that contain them
+        classes = dict()
+        for x in range(len(self.port2idx)):
+            signature = 0
+            for k, u in enumerate(masks):
+                if (u >> x) & 1:
+                    signature |= 1 << k
+            if signature != 0:
+                classes.setdefault(signature, []).append(x)
+
+        if len(classes) == len(self.port2idx):
+            return None
+
+        reduced_weights = defaultdict(lambda : 0)
+        port_sizes = []
+        reduced_masks = [ 0 ] * len(masks)
+        for c, (signature, ports) in enumerate(classes.items()):
+            port_sizes.append(len(ports))
+            for k in range(len(masks)):
+                if (signature >> k) & 1:
+                    reduced_masks[k] |= 1 << c
+        for u, ru in zip(masks, reduced_masks):
+            reduced_weights[ru] += weights[u]
+        return reduced_weights, port_sizes
+
+    def cycles_for_reduced_weights(self, weights, port_sizes):
+        """ Compute the number of cycles for the weights of an experiment on
+            ports where port x has the throughput of port_sizes[x] ports
+            (bottleneck algorithm with subset sums, exact for any simulation
+            processor).
+        """
+        num_qs = 1 << len(port_sizes)
+
+        # mass[q] is the number of uops that can only be executed on ports in
+        # q, size[q] is the number of original ports in q
+        mass = [ 0 ] * num_qs
+        for u, w in weights.items():
+            mass[u] += w
+        size = [ 0 ] * num_qs
+        for x, sz in enumerate(port_sizes):
+            bit = 1 << x
+            for block in range(0, num_qs, 2 * bit):
+                for q in range(block + bit, block + 2 * bit):
+                    mass[q] += mass[q - bit]
+                    size[q] = size[q - bit] + sz
+
+        max_mass, max_size = 0, 1
+        for q in range(1, num_qs):
+            if mass[q] * max_size > max_mass * size[q]:
+                max_mass, max_size = mass[q], size[q]
+        return float(Fraction(max_mass) / max_size)
+
+    def evaluate_weights_list(self, weights_list):
+        """ Compute the number of cycles for each of the weights dictionaries
+            in weights_list, with port reduction if enabled.
+        """
+        if not self.port_reduction or self.native_backend:
+            return self.cycles_for_weights_list(weights_list)
+
+        res = [ None ] * len(weights_list)
+        unreduced = []
+        for x, weights in enumerate(weights_list):
+            reduced = self.reduce_ports(weights)
+            self.num_reduction_exps += 1
+            if reduced is None:
+                self.num_effective_ports += len(self.port2idx)
+                unreduced.append(x)
+            else:
+                self.num_effective_ports += len(reduced[1])
+                res[x] = self.cycles_for_reduced_weights(*reduced)
+
+        unreduced_res = self.cycles_for_weights_list([ weights_list[x] for x in unreduced ])
+        for x, cycles in zip(unreduced, unreduced_res):
+            res[x] = cycles
+        return res
+
+    def evaluate_weights(self, weights):
+        if not self.port_reduction or self.native_backend:
+            return self.cycles_for_weights(weights)
+        return self.evaluate_weights_list([ weights ])[0]
+
+    def get_cycles(self, iseq: List[Insn]) -> float:
+        if self.cache is None:
+            return self.evaluate_weights(self.get_weights(iseq))
+
+        # drop the cache if the mapping has changed
+        self.get_insn_table()
+
+        key = self.cache_key(iseq)
+        res = self.cache_lookup(key)
+        if res is None:
+            res = self.evaluate_weights(self.get_weights(iseq))
+            self.cache_insert(key, res)
+        return res
+
+    def execute_many(self, iseqs: List[List[Insn]], **kwargs) -> List[Dict[str, float]]:
+        if self.cache is None:
+            weights_list = [ self.get_weights(iseq) for iseq in iseqs ]
+            return [ { 'cycles': c } for c in self.evaluate_weights_list(weights_list) ]
+
+        # drop the cache if the mapping has changed
+        self.get_insn_table()
+
+        keys = [ self.cache_key(iseq) for iseq in iseqs ]
+        results = dict()
+        missing = dict()
+        for key, iseq in zip(keys, iseqs):
+            if key in results or key in missing:
+                # repeated experiments in one batch count as hits
+                self.cache_hits += 1
+                continue
+            res = self.cache_lookup(key)
+            if res is None:
+                missing[key] = iseq
+            else:
+                results[key] = res
+
+        weights_list = [ self.get_weights(iseq) for iseq in missing.values() ]
+        for key, res in zip(missing.keys(), self.evaluate_weights_list(weights_list)):
+            results[key] = res
+            self.cache_insert(key, res)
+
+        return [ { 'cycles': results[key] } for key in keys ]
+
+    def eval_list(self, exps: ExperimentList, jobs=1, chunk_size=None):
+        # wrappers like the jittered and delayed processors override the
+        # execute methods, they need to be used for every experiment
+        overridden = (type(self).execute is not Processor.execute or
+                type(self).execute_many is not SimProcessor.execute_many)
+        if jobs != 1 or self.cache is not None or overridden:
+            return super().eval_list(exps, jobs=jobs, chunk_size=chunk_size)
+        # use the cached multisets of the experiments
+        exps = list(exps)
+        weights_list = [ self.get_weights_for_items(e.items()) for e in exps ]
+        for e, c in zip(exps, self.evaluate_weights_list(weights_list)):
+            e.result = { 'cycles': c }
 
     @abstractmethod
     def cycles_for_weights(self, weights):
@@ -55,4 +368,11 @@ class SimProcessor(Processor):
         """
         pass
 
+    def cycles_for_weights_list(self, weights_list):
+        """ Compute the number of cycles for each of the weights dictionaries
+            in weights_list (see cycles_for_weights).
+            Implementations that can process many experiments at once should
+            override this.
+        """
+        return [ self.cycles_for_weights(w) for w in weights_list ]
 
@@ -0,0 +1,45 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import os
+import random
+import sys
+
+import pytest
+
+# make the pm-testbench modules importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.architecture import Architecture
+from utils.mapping import Mapping3
+from processors.processor import Processor
+
+sim_processors = ["bottleneck", "zetabottleneck", "sparsebottleneck",
+        "cppbottleneck", "cppzetabottleneck", "cppsparsebottleneck",
+        "numpybottleneck", "scipylp", "maxflow"]
+
+def make_processor(name, mapping, **kwargs):
+    """ Create the processor with the given name for mapping or skip the
+        test if it is not available here.
+    """
+    try:
+        return Processor.class_for_name(name)(mapping, **kwargs)
+    except ImportError as e:
+        pytest.skip("{} is not available: {}".format(name, e))
+
+@pytest.fixture
+def arch():
+    res = Architecture()
+    res.add_insns([ "insn_{}".format(x) for x in range(8) ])
+    res.add_number_of_ports(4)
+    return res
+
+@pytest.fixture
+def mapping(arch):
+    random.seed(42)
+    return Mapping3.from_random(arch, num_uops_per_insn=3)
+
+@pytest.fixture
+def iseqs(arch):
+    rng = random.Random(7)
+    insns = arch.insn_list()
+    return [ [ rng.choice(insns) for x in range(rng.randint(1, 6)) ] for n in range(40) ]
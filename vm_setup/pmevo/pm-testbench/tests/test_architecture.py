@@ -0,0 +1,25 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import pickle
+
+from utils.architecture import Insn, Port
+
+def test_interned_insns(arch):
+    a = arch.insn_list()[0]
+    assert Insn(a.name) is a
+    assert pickle.loads(pickle.dumps(a)) is a
+    assert Insn.from_id(a.id) is a
+    assert Port("0") is arch.port_list()[0]
+
+def test_list_caches(arch):
+    before = arch.insn_list()
+    assert arch.insn_list() == before
+    name = before[0].name
+    # replacing an entry keeps the length of the dict
+    del arch.insns[name]
+    new = arch.add_insn("zzz_new")
+    assert arch.insn_list() == sorted(before[1:] + [new])
+    arch.restrict_insns(before[1:3])
+    assert arch.insn_list() == before[1:3]
+    arch.unrestrict_insns()
+    assert len(arch.insn_list()) == len(before)
@@ -0,0 +1,64 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import io
+
+import pytest
+
+from utils.experiment import Experiment, ExperimentList, CompactExperimentList
+
+def test_multiset(arch):
+    I = arch.insn_list()
+    e = Experiment(arch, [I[3], I[1], I[3], I[0], I[3]])
+    assert e.get_distinct_insns() == [I[3], I[1], I[0]]
+    assert e.items() == [(I[3], 3), (I[1], 1), (I[0], 1)]
+    assert e.num_occurrences(I[3]) == 3 and e.num_occurrences(I[2]) == 0
+    # the cached multiset is dropped when iseq is reassigned
+    e.iseq = [I[2]]
+    assert e.items() == [(I[2], 1)]
+
+def make_lists(arch, iseqs):
+    a = ExperimentList(arch)
+    b = CompactExperimentList(arch)
+    for x, iseq in enumerate(iseqs):
+        for elist in (a, b):
+            e = elist.create_exp(iseq)
+            e.result = { "cycles": float(x) }
+            if x % 2 == 0:
+                e.other_results.append({ "id": "sim", "cycles": x + 0.5 })
+    return a, b
+
+def test_compact_list(arch, iseqs):
+    a, b = make_lists(arch, iseqs)
+    assert len(a.exps) == len(b.exps)
+    for x, y in zip(a, b):
+        assert list(x.iseq) == list(y.iseq)
+        assert x.get_cycles() == y.get_cycles()
+        assert x.other_results == y.other_results
+        assert x.to_json_dict() == y.to_json_dict()
+    assert a.get_lengths() == b.get_lengths()
+
+    out = io.StringIO()
+    b.to_json(out)
+    c = ExperimentList.from_json(io.StringIO(out.getvalue()), arch)
+    assert [ e.to_json_dict() for e in c ] == [ e.to_json_dict() for e in a ]
+
+def test_compact_view_from_json_dict(arch, iseqs):
+    a, b = make_lists(arch, iseqs)
+    view = b.exps[3]
+    jsondict = view.to_json_dict()
+    jsondict["result"] = { "cycles": 42 }
+    jsondict["other_results"] = [ { "id": "new", "cycles": 1.5 } ]
+    view.from_json_dict(jsondict)
+    assert b.exps[3].get_cycles() == 42.0
+    assert { "id": "new", "cycles": 1.5 } in b.exps[3].other_results
+
+    jsondict["iseq"] = jsondict["iseq"] + jsondict["iseq"]
+    with pytest.raises(AssertionError):
+        view.from_json_dict(jsondict)
+
+def test_streaming_filter(arch, iseqs):
+    a, b = make_lists(arch, iseqs)
+    out = io.StringIO()
+    a.to_json(out)
+    short = ExperimentList.from_json(io.StringIO(out.getvalue()), arch, filter=lambda e: len(e.iseq) <= 2)
+    assert [ list(e.iseq) for e in short ] == [ list(e.iseq) for e in a if len(e.iseq) <= 2 ]
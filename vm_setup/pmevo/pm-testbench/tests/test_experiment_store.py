@@ -0,0 +1,45 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import os
+
+import pytest
+
+from utils.experiment import ExperimentList, CompactExperimentList
+from utils.experiment_store import load_experiment_list, store_experiment_list
+
+pytest.importorskip("numpy")
+
+def make_elist(arch, iseqs):
+    res = ExperimentList(arch)
+    for x, iseq in enumerate(iseqs):
+        e = res.create_exp(iseq)
+        e.result = { "cycles": float(x) }
+        if x % 3 == 0:
+            e.other_results.append({ "id": "sim", "cycles": x + 0.5 })
+    return res
+
+def summary(elist):
+    return [ ([ i.name for i in e.iseq ], e.get_cycles(), [ (r["id"], r["cycles"]) for r in e.other_results ])
+            for e in elist ]
+
+@pytest.mark.parametrize("ext", [".json", ".bin"])
+@pytest.mark.parametrize("cls", [ExperimentList, CompactExperimentList])
+def test_round_trip(tmp_path, arch, iseqs, ext, cls):
+    elist = make_elist(arch, iseqs)
+    path = str(tmp_path / ("exps" + ext))
+    store_experiment_list(elist, path)
+    loaded = load_experiment_list(path, arch, cls=cls)
+    assert summary(loaded) == summary(elist)
+
+def test_overwrite_mapped_input(tmp_path, arch, iseqs):
+    path = str(tmp_path / "exps.bin")
+    store_experiment_list(make_elist(arch, iseqs), path)
+
+    elist = load_experiment_list(path, arch, cls=CompactExperimentList)
+    for e in elist:
+        e.other_results.append({ "id": "new", "cycles": 1.0 })
+    expected = summary(elist)
+    store_experiment_list(elist, path)
+
+    assert summary(load_experiment_list(path, arch)) == expected
+    assert os.listdir(str(tmp_path)) == ["exps.bin"]
@@ -0,0 +1,40 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+from utils.architecture import Architecture
+from utils.experiment import ExperimentList
+from utils.partition_insns import restrict_elist
+
+def make_elist():
+    arch = Architecture()
+    arch.add_insns([ "insn_{}".format(x) for x in range(6) ])
+    arch.add_number_of_ports(2)
+    elist = ExperimentList(arch)
+    insns = arch.insn_list()
+    for a in insns:
+        for b in insns:
+            elist.create_exp([a, b])
+    return elist
+
+def test_restricted_view_keeps_arch():
+    elist = make_elist()
+    reps = elist.arch.insn_list()[:3]
+    restricted = restrict_elist(elist, reps)
+    assert len(restricted.arch.insn_list()) == 3
+    assert len(restricted) == 9
+
+    selected = restricted.select(lambda e: len(set(e.iseq)) == 1)
+    assert selected.arch is restricted.arch
+    assert len(selected) == 3
+
+    a, b = restricted.split_randomly(0.5)
+    assert a.arch is restricted.arch and b.arch is restricted.arch
+    for train, test in restricted.kfold(3):
+        assert train.arch is restricted.arch and test.arch is restricted.arch
+
+def test_view_of_view_refers_to_base():
+    elist = make_elist()
+    view = elist.view(range(10, 20))
+    sub = view.view([1, 3])
+    assert sub.base is elist
+    assert list(sub.exps) == [ elist.exps[11], elist.exps[13] ]
+    assert sub.arch is elist.arch
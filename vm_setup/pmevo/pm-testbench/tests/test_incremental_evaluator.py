@@ -0,0 +1,42 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import random
+
+import pytest
+
+from conftest import make_processor
+from processors.incremental_evaluator import IncrementalEvaluator
+from utils.experiment import ExperimentList
+
+@pytest.fixture
+def measured(arch, iseqs):
+    elist = ExperimentList(arch)
+    for x, iseq in enumerate(iseqs):
+        elist.create_exp(iseq).result = { "cycles": 0.5 + (x % 5) }
+    elist.create_exp(iseqs[0]).result = { "cycles": 0.0 }
+    elist.create_exp(iseqs[1])
+    return elist
+
+@pytest.mark.parametrize("name", ["bottleneck", "cppbottleneck", "numpybottleneck"])
+def test_update_matches_recomputation(mapping, arch, measured, name):
+    ev = IncrementalEvaluator(make_processor(name, mapping), measured)
+    assert len(ev.skipped) == 2
+
+    rng = random.Random(5)
+    ports = arch.port_list()
+    for n in range(30):
+        insn = rng.choice(arch.insn_list())
+        old_fitness = ev.get_fitness()
+        delta = ev.update(insn, [ rng.sample(ports, rng.randint(1, 3)) for u in range(rng.randint(1, 3)) ])
+        assert ev.get_fitness() == pytest.approx(old_fitness + delta)
+
+    fresh = IncrementalEvaluator(make_processor("bottleneck", mapping), measured)
+    assert ev.cycles == pytest.approx(fresh.cycles)
+    assert ev.get_fitness() == pytest.approx(fresh.get_fitness())
+
+def test_recompute_keeps_skipped(mapping, measured):
+    ev = IncrementalEvaluator(make_processor("bottleneck", mapping), measured)
+    fitness = ev.get_fitness()
+    ev.recompute()
+    assert len(ev.skipped) == 2
+    assert ev.get_fitness() == pytest.approx(fitness)
@@ -0,0 +1,26 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import io
+import json
+
+from utils.jsonable import JSONStreamReader
+
+doc = """{"kind": "ExperimentList", "nums": [1.5, -0.25, 12e3, 1E-2, -0, 7, 1.0e+10],
+  "empty": [], "nested": {"a": [1, 2, {"b": null}], "c": "x,]}"},
+  "exps": [ {"iseq": ["add", "mul"], "result": {"cycles": 2.5}}, true, false, null, 123456789 ] }"""
+
+def read_doc(infile, chunk_size):
+    reader = JSONStreamReader(infile, chunk_size=chunk_size)
+    res = dict()
+    for key in reader.iter_object():
+        if reader.peek() == "[":
+            res[key] = list(reader.iter_array())
+        else:
+            res[key] = reader.read_value()
+    assert reader.peek() is None
+    return res
+
+def test_every_chunk_size():
+    expected = json.load(io.StringIO(doc))
+    for chunk_size in range(1, len(doc) + 1):
+        assert read_doc(io.StringIO(doc), chunk_size) == expected, chunk_size
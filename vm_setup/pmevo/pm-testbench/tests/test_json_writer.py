@@ -0,0 +1,53 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import io
+import json
+
+from utils.experiment import ExperimentList
+from utils.jsonable import JSONable, mark_noindent, obj_to_json_str, write_json, indent_str
+
+def reference_json_str(obj, indent=0, dump_noindent=False):
+    """ The former recursive implementation of obj_to_json_str, which built
+        the whole string in memory.
+    """
+    if isinstance(obj, list) and len(obj) == 2 and obj[0] == "__noindent__":
+        return json.dumps(obj if dump_noindent else obj[1])
+    elif isinstance(obj, dict):
+        parts = [ reference_json_str(k, indent + 1, dump_noindent) + ": " +
+                reference_json_str(v, indent + 1, dump_noindent) for k, v in obj.items() ]
+        return ("{\n" + (indent + 1) * indent_str + (",\n" + (indent + 1) * indent_str).join(parts) +
+                "\n" + indent * indent_str + "}")
+    elif isinstance(obj, list):
+        parts = [ reference_json_str(v, indent + 1, dump_noindent) for v in obj ]
+        return ("[\n" + (indent + 1) * indent_str + (",\n" + (indent + 1) * indent_str).join(parts) +
+                "\n" + indent * indent_str + "]")
+    elif isinstance(obj, JSONable):
+        return reference_json_str(obj.to_json_dict())
+    elif isinstance(obj, int):
+        return '"{}"'.format(obj)
+    else:
+        return json.dumps(obj)
+
+def test_same_output_as_before(mapping, arch, iseqs):
+    elist = ExperimentList(arch)
+    for iseq in iseqs:
+        elist.create_exp(iseq).result = { "cycles": 1.5 }
+    data = { "a": [1, 2.5, None, True, "x"], "b": mark_noindent([1, [2]]), "m": mapping, "e": elist,
+            "empty": {}, "nested": [ { "c": mark_noindent({ "d": 1 }) } ] }
+    for dump_noindent in (False, True):
+        assert obj_to_json_str(data, dump_noindent=dump_noindent) == reference_json_str(data, dump_noindent=dump_noindent)
+
+def test_generators_are_written_as_lists():
+    out = io.StringIO()
+    write_json({ "gen": ( { "x": mark_noindent([x]) } for x in range(3) ) }, out)
+    assert out.getvalue() == reference_json_str({ "gen": [ { "x": mark_noindent([x]) } for x in range(3) ] })
+
+def test_experiment_list_round_trip(arch, iseqs):
+    elist = ExperimentList(arch)
+    for iseq in iseqs:
+        elist.create_exp(iseq).result = { "cycles": 2.0 }
+    out = io.StringIO()
+    elist.to_json(out)
+    assert json.loads(out.getvalue())["exps"] == [ e.to_json_dict() for e in elist ]
+    loaded = ExperimentList.from_json(io.StringIO(out.getvalue()), arch)
+    assert [ e.to_json_dict() for e in loaded ] == [ e.to_json_dict() for e in elist ]
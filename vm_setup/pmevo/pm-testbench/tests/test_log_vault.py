@@ -0,0 +1,79 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import os
+import struct
+
+import pytest
+
+from utils.jsonable import LogVault
+
+def make_log(path, num):
+    vault = LogVault(path)
+    for x in range(num):
+        vault.add({ "x": x })
+    vault.close()
+    return path + ".log"
+
+def record_offsets(logname):
+    with open(logname, "rb") as infile:
+        data = infile.read()
+    res = []
+    pos = len(LogVault.magic)
+    while pos < len(data):
+        res.append(pos)
+        length, checksum = struct.unpack_from("<II", data, pos)
+        pos += 8 + length
+    return res
+
+def entries(path):
+    vault = LogVault(path)
+    res = [ i for i, d in vault.iter_entries() ]
+    vault.close()
+    return res
+
+def test_resume(tmp_path):
+    path = str(tmp_path / "a.json")
+    make_log(path, 3)
+    vault = LogVault(path)
+    vault.add({ "x": 3 })
+    assert [ i for i, d in vault.iter_entries() ] == [0, 1, 2, 3]
+    vault.finalize()
+    with open(path) as infile:
+        assert infile.read().count('"x"') == 4
+
+@pytest.mark.parametrize("cut", [1, 5, 8, 12])
+def test_torn_tail(tmp_path, cut):
+    path = str(tmp_path / "a.json")
+    logname = make_log(path, 4)
+    size = os.path.getsize(logname)
+    with open(logname, "r+b") as logfile:
+        logfile.truncate(size - cut)
+    assert entries(path) == [0, 1, 2]
+    # the torn record has been cut off
+    assert len(record_offsets(logname)) == 3
+
+def test_bad_checksum_at_tail(tmp_path):
+    path = str(tmp_path / "a.json")
+    logname = make_log(path, 4)
+    with open(logname, "r+b") as logfile:
+        logfile.seek(-1, os.SEEK_END)
+        logfile.write(b"#")
+    assert entries(path) == [0, 1, 2]
+
+@pytest.mark.parametrize("field", ["payload", "length"])
+def test_corruption_in_the_middle(tmp_path, field):
+    path = str(tmp_path / "a.json")
+    logname = make_log(path, 4)
+    offset = record_offsets(logname)[1]
+    with open(logname, "r+b") as logfile:
+        if field == "payload":
+            logfile.seek(offset + 9)
+            logfile.write(b"#")
+        else:
+            logfile.seek(offset)
+            logfile.write(struct.pack("<I", 1 << 20))
+    size = os.path.getsize(logname)
+    with pytest.raises(SystemExit):
+        LogVault(path)
+    # the log is left untouched
+    assert os.path.getsize(logname) == size
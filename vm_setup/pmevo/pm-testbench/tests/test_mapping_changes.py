@@ -0,0 +1,59 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import pickle
+
+import pytest
+
+from conftest import sim_processors, make_processor
+
+@pytest.mark.parametrize("name", sim_processors)
+@pytest.mark.parametrize("cached", [False, True])
+def test_in_place_changes(mapping, arch, name, cached):
+    proc = make_processor(name, mapping)
+    if cached:
+        proc.enable_cache()
+    insn = arch.insn_list()[0]
+    P = arch.port_list()
+    iseq = [insn] * 4
+    mapping.assignment[insn] = [ [P[0]] ]
+    assert proc.get_cycles(iseq) == pytest.approx(4.0)
+
+    # add a uop to the instruction
+    mapping.assignment[insn].append([P[0]])
+    assert proc.get_cycles(iseq) == pytest.approx(8.0)
+
+    # add a port to a uop
+    mapping.assignment[insn][1].append(P[1])
+    assert proc.get_cycles(iseq) == pytest.approx(4.0)
+
+    # replace a uop
+    mapping.assignment[insn][0] = [P[2], P[3]]
+    assert proc.get_cycles(iseq) == pytest.approx(2.0)
+
+    mapping.assignment[insn].pop()
+    assert proc.get_cycles(iseq) == pytest.approx(2.0)
+    mapping.assignment[insn][0].remove(P[3])
+    assert proc.get_cycles(iseq) == pytest.approx(4.0)
+
+def test_copies_are_independent(mapping, arch):
+    insn = arch.insn_list()[0]
+    copied = pickle.loads(pickle.dumps(mapping))
+    version = mapping.version
+    copied.assignment[insn].append([arch.port_list()[0]])
+    assert mapping.version == version
+    assert copied.assignment[insn] != mapping.assignment[insn]
+
+def test_compiled_table(mapping, arch):
+    proc = make_processor("bottleneck", mapping)
+    insn = arch.insn_list()[1]
+    P = arch.port_list()
+    mapping.assignment[insn] = [ [P[0], P[1]] ]
+    entry = proc.get_insn_entry(insn)
+    assert len(entry) == 1 and entry[0][1] == 1
+
+    mapping.assignment[insn].append([P[1], P[0]])
+    entry = proc.get_insn_entry(insn)
+    assert len(entry) == 1 and entry[0][1] == 2
+
+    mapping.assignment[insn][0].append(P[2])
+    assert sorted(n for u, n in proc.get_insn_entry(insn)) == [1, 1]
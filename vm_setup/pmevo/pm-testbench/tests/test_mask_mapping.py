@@ -0,0 +1,47 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import copy
+import io
+import pickle
+import random
+
+from utils.mapping import Mapping, Mapping2, MaskMapping
+
+def test_conversions(mapping, arch):
+    mm = MaskMapping.from_mapping(mapping)
+    back = mm.to_mapping3()
+    for i in arch.insn_list():
+        assert sorted(map(sorted, back.assignment[i])) == sorted(map(sorted, mapping.assignment[i]))
+    assert MaskMapping.from_mapping(back) == mm
+
+    random.seed(3)
+    m2 = Mapping2.from_random(arch)
+    back2 = MaskMapping.from_mapping(m2).to_mapping2()
+    assert { i: sorted(ps) for i, ps in back2.assignment.items() } == { i: sorted(ps) for i, ps in m2.assignment.items() }
+
+def test_json_round_trip(mapping):
+    mm = MaskMapping.from_mapping(mapping)
+    out = io.StringIO()
+    mm.to_json(out)
+    loaded = Mapping.read_from_json_str(out.getvalue())
+    assert type(loaded) is MaskMapping
+    assert loaded == mm
+    assert hash(loaded) == hash(mm)
+    assert pickle.loads(pickle.dumps(mm)) == mm
+    assert copy.deepcopy(mm) == mm
+
+def test_copy_and_diff(mapping, arch):
+    mm = MaskMapping.from_mapping(mapping)
+    old_hash = hash(mm)
+    c = mm.copy()
+    insn = arch.insn_list()[3]
+    c.assignment[insn] = (1, 3)
+    assert mm.assignment[insn] != (1, 3)
+    assert c != mm
+    assert c.diff(mm) == { insn: ((1, 3), mm.assignment[insn]) }
+    assert mm.diff(mm.copy()) == {}
+    assert hash(mm) == old_hash
+
+    c.set_uops(insn, [ arch.port_list()[:2] ])
+    assert c.get_uops(insn) == [ arch.port_list()[:2] ]
+    assert c.assignment[insn] == (0b11,)
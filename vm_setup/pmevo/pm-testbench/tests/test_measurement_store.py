@@ -0,0 +1,32 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import pickle
+
+from utils.measurement_store import MeasurementStore, compute_fingerprint
+
+params = { "repetitions": 5, "target_time_us": 10000 }
+
+def test_lookup(tmp_path):
+    fp = compute_fingerprint("server", ["b", "a"], 4)
+    assert fp == compute_fingerprint("server", ["a", "b"], 4)
+    assert fp != compute_fingerprint("server", ["a", "b"], 5)
+
+    with MeasurementStore(str(tmp_path / "store.db")) as store:
+        store.register_server(fp, "server")
+        assert store.lookup(fp, ["a", "b", "a"], params) is None
+        store.insert(fp, ["a", "b", "a"], params, { "cycles": 2.0 })
+        store.insert(fp, ["b"], params, { "cycles": None, "error_cause": "x" })
+
+        assert store.lookup(fp, ["b", "a", "a"], dict(reversed(list(params.items())))) == { "cycles": 2.0 }
+        assert store.lookup(fp, ["a", "b"], params) is None
+        assert store.lookup(fp, ["a", "b", "a"], { "repetitions": 6, "target_time_us": 10000 }) is None
+        assert store.lookup(fp, ["b"], params) is None
+        assert store.get_stats() == { "hits": 1, "misses": 4, "inserts": 1 }
+
+    with MeasurementStore(str(tmp_path / "store.db")) as store:
+        assert store.lookup(fp, ["a", "a", "b"], params) == { "cycles": 2.0 }
+        assert store.get_servers() == [ (fp, "server", 1, 2) ]
+        store = pickle.loads(pickle.dumps(store))
+        assert store.invalidate(fp) == 1
+        assert store.lookup(fp, ["a", "a", "b"], params) is None
+        assert store.get_servers() == []
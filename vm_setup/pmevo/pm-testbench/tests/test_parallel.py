@@ -0,0 +1,28 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import multiprocessing
+import pickle
+
+import pytest
+
+from conftest import make_processor
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+@pytest.mark.parametrize("name", ["bottleneck", "cppbottleneck", "delayedjitteredbottleneck"])
+def test_execute_parallel(monkeypatch, mapping, iseqs, start_method, name):
+    if start_method not in multiprocessing.get_all_start_methods():
+        pytest.skip("start method {} is not available".format(start_method))
+    monkeypatch.setattr(multiprocessing, "Pool", multiprocessing.get_context(start_method).Pool)
+
+    kwargs = { "delay": 0, "jitter": 0.0 } if name.startswith("delayed") else {}
+    proc = make_processor(name, mapping, **kwargs)
+    proc.enable_cache()
+    expected = proc.execute_many(iseqs)
+    assert proc.execute_parallel(iseqs, jobs=2, chunk_size=7) == expected
+
+def test_pickle_wrapped_processor(mapping, iseqs):
+    proc = make_processor("delayedjitteredbottleneck", mapping, delay=0, jitter=0.0)
+    copied = pickle.loads(pickle.dumps(proc))
+    assert copied.delay == 0 and copied.jitter == 0.0
+    assert copied.get_description() == proc.get_description()
+    assert copied.execute_many(iseqs) == proc.execute_many(iseqs)
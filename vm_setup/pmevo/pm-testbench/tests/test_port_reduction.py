@@ -0,0 +1,49 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import random
+
+import pytest
+
+from conftest import sim_processors, make_processor
+from utils.architecture import Architecture
+from utils.mapping import Mapping3
+
+@pytest.fixture
+def symmetric_mapping():
+    """ Mapping where ports 0-2 and ports 3-4 are interchangeable and port 5
+        is never used.
+    """
+    arch = Architecture()
+    arch.add_insns([ "insn_{}".format(x) for x in range(6) ])
+    arch.add_number_of_ports(6)
+    P = arch.port_list()
+    I = arch.insn_list()
+    alu = P[0:3]
+    mem = P[3:5]
+    res = Mapping3(arch)
+    res.assignment[I[0]] = [ alu ]
+    res.assignment[I[1]] = [ alu, alu ]
+    res.assignment[I[2]] = [ mem ]
+    res.assignment[I[3]] = [ mem, alu ]
+    res.assignment[I[4]] = [ alu + mem ]
+    res.assignment[I[5]] = [ mem, mem, alu + mem ]
+    return res
+
+@pytest.mark.parametrize("name", sim_processors)
+def test_reduced_cycles_are_unchanged(symmetric_mapping, name):
+    insns = symmetric_mapping.arch.insn_list()
+    rng = random.Random(3)
+    iseqs = [ [ rng.choice(insns) for x in range(rng.randint(1, 8)) ] for n in range(100) ]
+
+    proc = make_processor(name, symmetric_mapping)
+    expected = [ proc.get_cycles(iseq) for iseq in iseqs ]
+
+    proc.enable_port_reduction()
+    assert [ proc.get_cycles(iseq) for iseq in iseqs ] == pytest.approx(expected)
+    assert [ r["cycles"] for r in proc.execute_many(iseqs) ] == pytest.approx(expected)
+
+    stats = proc.get_stats()
+    if proc.native_backend:
+        assert "num_reduction_exps" not in stats
+    else:
+        assert stats["avg_effective_ports"] < 6
@@ -0,0 +1,28 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import random
+
+import pytest
+
+from conftest import sim_processors, make_processor
+
+@pytest.mark.parametrize("name", sim_processors)
+def test_portless_uops(mapping, arch, iseqs, name):
+    """ Uops without ports are counted in every set of ports, as in the
+        reference bottleneck processor.
+    """
+    rng = random.Random(5)
+    for i in arch.insn_list():
+        if rng.random() < 0.5:
+            mapping.assignment[i].append([])
+    ref = make_processor("bottleneck", mapping)
+    proc = make_processor(name, mapping)
+    expected = [ ref.get_cycles(iseq) for iseq in iseqs ]
+    assert [ r["cycles"] for r in proc.execute_many(iseqs) ] == pytest.approx(expected)
+
+@pytest.mark.parametrize("name", sim_processors)
+def test_only_portless_uops(mapping, arch, name):
+    insn = arch.insn_list()[0]
+    mapping.assignment[insn] = [ [], [] ]
+    proc = make_processor(name, mapping)
+    assert proc.get_cycles([insn] * 3) == pytest.approx(6.0)
@@ -0,0 +1,61 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import random
+
+import pytest
+
+from conftest import sim_processors, make_processor
+from utils.experiment import ExperimentList
+from utils.mapping import Mapping2, MaskMapping
+
+@pytest.fixture(params=["Mapping3", "Mapping2", "MaskMapping"])
+def any_mapping(request, arch, mapping):
+    if request.param == "Mapping2":
+        random.seed(3)
+        return Mapping2.from_random(arch)
+    if request.param == "MaskMapping":
+        return MaskMapping.from_mapping(mapping)
+    return mapping
+
+@pytest.mark.parametrize("name", sim_processors)
+def test_agrees_with_bottleneck(any_mapping, iseqs, name):
+    expected = [ make_processor("bottleneck", any_mapping).get_cycles(iseq) for iseq in iseqs ]
+    proc = make_processor(name, any_mapping)
+    assert [ proc.get_cycles(iseq) for iseq in iseqs ] == pytest.approx(expected)
+    assert [ r["cycles"] for r in proc.execute_many(iseqs) ] == pytest.approx(expected)
+
+@pytest.mark.parametrize("name", sim_processors)
+def test_eval_list(mapping, arch, iseqs, name):
+    expected = [ make_processor("bottleneck", mapping).get_cycles(iseq) for iseq in iseqs ]
+    elist = ExperimentList(arch)
+    for iseq in iseqs:
+        elist.create_exp(iseq)
+    make_processor(name, mapping).eval_list(elist)
+    assert [ e.get_cycles() for e in elist ] == pytest.approx(expected)
+
+@pytest.mark.parametrize("name", ["bottleneck", "cppbottleneck", "numpybottleneck"])
+def test_cache(mapping, iseqs, name):
+    proc = make_processor(name, mapping)
+    expected = [ r["cycles"] for r in proc.execute_many(iseqs) ]
+    proc.enable_cache()
+    assert [ r["cycles"] for r in proc.execute_many(iseqs) ] == expected
+    # the same experiments with permuted instructions are cache hits
+    permuted = [ list(reversed(iseq)) for iseq in iseqs ]
+    assert [ r["cycles"] for r in proc.execute_many(permuted) ] == expected
+    stats = proc.get_stats()
+    assert stats["cache_hits"] >= len(iseqs)
+    assert stats["cache_entries"] <= len(iseqs)
+
+def test_cpp_threads(mapping, iseqs):
+    expected = [ r["cycles"] for r in make_processor("cppbottleneck", mapping).execute_many(iseqs) ]
+    proc = make_processor("cppbottleneck", mapping, num_threads=3, parallel_threshold=1)
+    assert [ r["cycles"] for r in proc.execute_many(iseqs) ] == pytest.approx(expected)
+
+def test_cpp_many_mappings(mapping, arch, iseqs):
+    proc = make_processor("cppbottleneck", mapping)
+    random.seed(11)
+    mappings = [ mapping, MaskMapping.from_mapping(mapping), Mapping2.from_random(arch) ]
+    res = type(proc).cycles_for_mappings(mappings, iseqs)
+    for m, row in zip(mappings, res):
+        expected = [ make_processor("bottleneck", m).get_cycles(iseq) for iseq in iseqs ]
+        assert list(row) == pytest.approx(expected)
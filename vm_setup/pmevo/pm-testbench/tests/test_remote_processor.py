@@ -0,0 +1,132 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+import pickle
+
+import pytest
+
+rpyc = pytest.importorskip("rpyc")
+
+from processors.remote_processor import ConnectionPool, RemoteProcessor
+from utils.measurement_store import MeasurementStore
+
+class FakeRoot:
+    def __init__(self, server):
+        self.server = server
+
+    def get_insns(self):
+        return ["add a, b", "sub c"]
+
+    def get_num_ports(self):
+        return 2
+
+    def get_description(self):
+        return "fake server"
+
+    def run_experiment(self, exp, **kwargs):
+        self.server.calls.append(1)
+        if self.server.fail is not None:
+            exc, self.server.fail = self.server.fail, None
+            raise exc
+        return { "cycles": float(len(exp)) }
+
+class FakeBatchRoot(FakeRoot):
+    def run_experiments(self, exps, callback=None, **kwargs):
+        self.server.calls.append(len(exps))
+        for x, exp in enumerate(exps):
+            callback(x, { "cycles": float(len(exp)) })
+
+class FakeConnection:
+    def __init__(self, server):
+        self.root = server.root_cls(server)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def ping(self):
+        if self.closed:
+            raise EOFError("closed")
+
+class FakeAsyncResult:
+    def __init__(self, fun, args, kwargs):
+        self.fun, self.args, self.kwargs = fun, args, kwargs
+        self.value = None
+
+    def set_expiry(self, timeout):
+        pass
+
+    def wait(self):
+        self.fun(*self.args, **self.kwargs)
+
+class FakeServer:
+    def __init__(self, root_cls):
+        self.root_cls = root_cls
+        self.connections = []
+        self.calls = []
+        self.fail = None
+
+    def connect(self, *args, **kwargs):
+        c = FakeConnection(self)
+        self.connections.append(c)
+        return c
+
+@pytest.fixture(params=[FakeRoot, FakeBatchRoot])
+def server(request, monkeypatch):
+    res = FakeServer(request.param)
+    monkeypatch.setattr(rpyc, "ssl_connect", res.connect)
+    monkeypatch.setattr(rpyc, "async_", lambda fun: lambda *args, **kwargs: FakeAsyncResult(fun, args, kwargs))
+    return res
+
+def test_connections_are_reused(server):
+    proc = RemoteProcessor("host")
+    insns = proc.arch.insn_list()
+    for x in range(5):
+        assert proc.execute(insns)["cycles"] == 2.0
+    assert len(server.connections) == 1
+
+    server.fail = EOFError("broken")
+    assert proc.execute(insns)["cycles"] == 2.0
+    assert len(server.connections) == 2
+    assert server.connections[0].closed
+
+    server.fail = rpyc.AsyncResultTimeout("timeout")
+    assert proc.execute(insns) == { "cycles": None, "error_cause": "connection timeout" }
+    assert server.connections[1].closed
+
+    proc = pickle.loads(pickle.dumps(proc))
+    assert proc.execute(insns)["cycles"] == 2.0
+    proc.close()
+    assert all(c.closed for c in server.connections)
+
+def test_pool_replaces_broken_connections(server):
+    pool = ConnectionPool(server.connect, max_idle=1, health_check_interval=0.0)
+    a, b = pool.acquire(), pool.acquire()
+    pool.release(a)
+    pool.release(b)
+    assert b.closed and not a.closed
+    a.closed = True
+    c = pool.acquire()
+    assert c is not a
+    assert pool.num_connects == 3
+
+def test_execute_many_batches_and_stores(server, tmp_path):
+    store = MeasurementStore(str(tmp_path / "store.db"))
+    proc = RemoteProcessor("host", store=store, batch_size=3)
+    insns = proc.arch.insn_list()
+    iseqs = [ insns[:1 + (k % 2)] * (k + 1) for k in range(7) ]
+
+    results = proc.execute_many(iseqs, repetitions=3)
+    assert [ r["cycles"] for r in results ] == [ float(len(iseq)) for iseq in iseqs ]
+    if server.root_cls is FakeBatchRoot:
+        assert server.calls == [3, 3, 1]
+    else:
+        assert len(server.calls) == 7
+        assert not proc.batch_supported
+
+    server.calls.clear()
+    assert proc.execute_many(iseqs, repetitions=3) == results
+    assert proc.execute(list(reversed(iseqs[1])), repetitions=3) == results[1]
+    assert server.calls == []
+    assert len(proc.execute_many(iseqs, repetitions=4)) == len(iseqs)
+    assert sum(server.calls) == len(iseqs)
+    store.close()
@@ -10,20 +10,40 @@ def normalize_insn(name):
     return name
 
 
-class Insn:
-    def __init__(self, name: str):
-        self.name = name
+class Interned:
+    """ Base class for objects that exist only once per name.
+        Each object gets a dense integer id on creation, which is used for
+        hashing and (together with the uniqueness) makes comparisons cheap.
+        Ids are only stable within one process.
+    """
+    __slots__ = ("name", "id")
+
+    def __new__(cls, name: str):
+        registry = cls.registry
+        res = registry.get(name, None)
+        if res is None:
+            res = super().__new__(cls)
+            res.name = name
+            res.id = len(cls.by_id)
+            registry[name] = res
+            cls.by_id.append(res)
+        return res
 
-    def __str__(self):
-        return "I_{" + self.name + "}"
+    def __reduce__(self):
+        # re-intern when unpickling
+        return (type(self), (self.name,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __repr__(self):
         return self.__str__()
 
     def __eq__(self, other):
-        if type(other) is type(self):
-            return self.name == other.name
-        return False
+        return self is other
 
     def __lt__(self, other):
         if type(other) is type(self):
@@ -31,60 +51,148 @@ class Insn:
         return False
 
     def __hash__(self):
-        return hash(self.name)
+        return self.id
+
+    @classmethod
+    def num_ids(cls):
+        """ Get the number of ids that have been assigned so far.
+        """
+        return len(cls.by_id)
+
+    @classmethod
+    def from_id(cls, ident: int):
+        return cls.by_id[ident]
 
-class Port:
-    def __init__(self, name: str):
-        self.name = name
+class Insn(Interned):
+    __slots__ = ()
+    registry = dict()
+    by_id = []
+
+    def __str__(self):
+        return "I_{" + self.name + "}"
+
+class Port(Interned):
+    __slots__ = ()
+    registry = dict()
+    by_id = []
 
     def __str__(self):
         return "P_{" + self.name + "}"
 
-    def __repr__(self):
-        return self.__str__()
+class VersionedDict(dict):
+    """ Dictionary that counts modifications in its version attribute, so
+        that data derived from it can be checked for being up to date.
+    """
+    version = 0
 
-    def __eq__(self, other):
-        if type(other) is type(self):
-            return self.name == other.name
-        return False
+    def modified(self):
+        self.version = self.version + 1
 
-    def __lt__(self, other):
-        if type(other) is type(self):
-            return self.name < other.name
-        return False
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.modified()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.modified()
+
+    def __ior__(self, other):
+        res = super().__ior__(other)
+        self.modified()
+        return res
+
+    def clear(self):
+        super().clear()
+        self.modified()
+
+    def pop(self, *args):
+        res = super().pop(*args)
+        self.modified()
+        return res
+
+    def popitem(self):
+        res = super().popitem()
+        self.modified()
+        return res
+
+    def setdefault(self, key, default=None):
+        res = super().setdefault(key, default)
+        self.modified()
+        return res
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.modified()
 
-    def __hash__(self):
-        return hash(self.name)
 
 class Architecture(JSONable):
     def __init__(self):
         super().__init__()
-        self.insns = dict()
-        self.ports = dict()
+        self._insns = VersionedDict()
+        self._ports = VersionedDict()
         self.name = None
         self.restricted = None
+        self.invalidate()
+
+    def invalidate(self):
+        """ Drop the cached sorted lists of instructions and ports.
+            This happens automatically when using the methods of this class,
+            when assigning insns or ports and when modifying their dicts.
+        """
+        self.insn_list_cache = None
+        self.port_list_cache = None
+
+    @property
+    def insns(self):
+        return self._insns
+
+    @insns.setter
+    def insns(self, value):
+        self._insns = VersionedDict(value)
+        self.invalidate()
+
+    @property
+    def ports(self):
+        return self._ports
+
+    @ports.setter
+    def ports(self, value):
+        self._ports = VersionedDict(value)
+        self.invalidate()
 
     def insn_list(self):
-        if  self.restricted is not None:
-            insns = filter(lambda x: x in self.restricted, self.insns.values())
-        else:
-            insns = self.insns.values()
-        return sorted(insns)
+        cache = self.insn_list_cache
+        # also catch direct modifications of the insns dict
+        if cache is None or cache[0] != self.insns.version:
+            if self.restricted is not None:
+                insns = filter(lambda x: x in self.restricted, self.insns.values())
+            else:
+                insns = self.insns.values()
+            cache = (self.insns.version, sorted(insns))
+            self.insn_list_cache = cache
+        return list(cache[1])
 
     def port_list(self):
-        return sorted(self.ports.values())
+        cache = self.port_list_cache
+        # also catch direct modifications of the ports dict
+        if cache is None or cache[0] != self.ports.version:
+            cache = (self.ports.version, sorted(self.ports.values()))
+            self.port_list_cache = cache
+        return list(cache[1])
 
     def add_insn(self, name: str):
         normalized_name = normalize_insn(name)
-        assert(name not in self.insns.keys())
+        assert(normalized_name not in self.insns.keys())
         new_insn = Insn(normalized_name)
         self.insns[normalized_name] = new_insn
+        self.invalidate()
         return new_insn
 
     def add_port(self, name: str):
         assert(name not in self.ports.keys())
         new_port = Port(name)
         self.ports[name] = new_port
+        self.invalidate()
         return new_port
 
     def add_insns(self, names: List[str]):
@@ -99,10 +207,12 @@ class Architecture(JSONable):
         self.add_ports([str(i) for i in range(0, num)])
 
     def restrict_insns(self, insns):
-        self.restricted = list(insns)
+        self.restricted = set(insns)
+        self.invalidate()
 
     def unrestrict_insns(self):
         self.restricted = None
+        self.invalidate()
 
     def __repr__(self):
         res = "Architecture(insns={}, ports={})".format(repr(self.insns), repr(self.ports))
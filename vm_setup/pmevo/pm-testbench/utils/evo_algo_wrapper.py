@@ -67,11 +67,9 @@ class Inferrer(ABC):
                 old_exps = exps
                 old_arch = old_exps.arch
 
-                singleton_exps = ExperimentList(exps.arch)
-                singleton_exps.exps = [e for e in exps if len(e.iseq) == 1]
+                singleton_exps = exps.select(lambda e: len(e.iseq) == 1)
 
-                complex_exps = ExperimentList(exps.arch)
-                complex_exps.exps = [e for e in exps if len(e.iseq) > 1]
+                complex_exps = exps.select(lambda e: len(e.iseq) > 1)
 
                 reps, insn_to_rep = compute_representatives(complex_exps, singleton_exps, epsilon=self.epsilon)
 
@@ -111,8 +109,7 @@ class EvoAlgoWrapper(Inferrer):
                 ]
 
     def infer(self, exps):
-        singleton_exps = ExperimentList(exps.arch)
-        singleton_exps.exps = [e for e in exps if len(e.iseq) == 1]
+        singleton_exps = exps.select(lambda e: len(e.iseq) == 1)
         singleton_elist_path = "/tmp/pmtestbench_tmp_singleton.exps"
         singleton_elist_str = export_explist(singleton_exps)
         with open(singleton_elist_path, "w") as ef:
@@ -1,5 +1,8 @@
 # vim: et:ts=4:sw=4:fenc=utf-8
 
+from array import array
+from collections import Counter
+import math
 import random
 
 from typing import *
@@ -20,14 +23,44 @@ class Experiment(jsonable.JSONable):
         self.rid = None
         self.other_results = []
 
+    @property
+    def iseq(self):
+        return self._iseq
+
+    @iseq.setter
+    def iseq(self, value):
+        self._iseq = value
+        self._multiset = None
+
+    def get_multiset(self):
+        """ Get the multiset of instructions of this experiment as a pair of
+            a tuple of the distinct instructions (in the order of their first
+            occurrence) and a tuple with the number of occurrences of each of
+            them.
+            The result is computed lazily and cached until iseq is reassigned
+            (modifying the iseq list in place is not detected).
+        """
+        res = self._multiset
+        if res is None:
+            counter = Counter(self.iseq)
+            insns = tuple(counter.keys())
+            res = (insns, tuple(counter[i] for i in insns))
+            self._multiset = res
+        return res
+
     def items(self):
-        return [(i, self.num_occurrences(i)) for i in self.get_distinct_insns()]
+        insns, counts = self.get_multiset()
+        return list(zip(insns, counts))
 
     def get_distinct_insns(self):
-        return [i for i in Counter(self.iseq)]
+        return list(self.get_multiset()[0])
 
     def num_occurrences(self, insn):
-        return self.iseq.count(insn)
+        insns, counts = self.get_multiset()
+        for i, n in zip(insns, counts):
+            if i is insn:
+                return n
+        return 0
 
     def __str__(self):
         return "E_" + str(self.rid)
@@ -88,28 +121,84 @@ class ExperimentList(jsonable.JSONable):
     def __iter__(self):
         return iter(self.exps)
 
-    def split_randomly(self, ratio):
+    def get_lengths(self):
+        """ Get a list with the number of instructions of each experiment.
+        """
+        return [ len(e.iseq) for e in self.exps ]
+
+    def view(self, indices):
+        """ Create an unmodifiable ExperimentListView of the experiments at
+            the given indices of this list, without copying experiments.
+        """
+        return ExperimentListView(self, indices)
+
+    def select(self, predicate):
+        """ Create a view of the experiments that satisfy predicate.
+        """
+        return self.view([ x for x, e in enumerate(self.exps) if predicate(e) ])
+
+    def shuffled_indices(self, stratify=False):
+        """ Get a random permutation of the indices of this list. If stratify
+            is True, the indices are ordered such that experiments of each
+            length are evenly spread over the permutation, so that splitting
+            it into consecutive parts preserves the distribution of lengths.
+        """
+        num = len(self.exps)
+        if not stratify:
+            indices = list(range(num))
+            random.shuffle(indices)
+            return indices
+
+        by_length = dict()
+        for x, l in enumerate(self.get_lengths()):
+            by_length.setdefault(l, []).append(x)
+
+        # give each index a position in [0, 1) that is evenly spaced within
+        # its length group (with a random offset) and sort by that
+        keyed = []
+        for l, group in sorted(by_length.items()):
+            random.shuffle(group)
+            offset = random.random()
+            for n, x in enumerate(group):
+                keyed.append(((n + offset) / len(group), x))
+        keyed.sort()
+        return [ x for k, x in keyed ]
+
+    def split_randomly(self, ratio, stratify=False):
         """
             Create two ExperimentList "views" of this list, split randomly,
             with round(len(self.exps) * ratio) elements in the first view and
             len(self.exps) - round(len(self.exps) * ratio) elements in the
             second view.
+            If stratify is True, both views have (approximately) the same
+            distribution of experiment lengths.
         """
-        all_exps = self.exps.copy()
-        random.shuffle(all_exps)
-
-        inA = round(len(all_exps) * ratio)
+        indices = self.shuffled_indices(stratify=stratify)
 
-        resA = ExperimentList(self.arch)
-        resA.exps.extend(all_exps[:inA-1])
-        resA.modifiable = False
+        inA = round(len(indices) * ratio)
 
-        resB = ExperimentList(self.arch)
-        resB.exps.extend(all_exps[inA-1:])
-        resB.modifiable = False
+        resA = self.view(indices[:inA])
+        resB = self.view(indices[inA:])
 
         return (resA, resB)
 
+    def kfold(self, k, stratify=False):
+        """ Create k pairs of (training, test) views for k-fold cross
+            validation: the test views partition this list into parts whose
+            sizes differ by at most one, each training view contains the
+            experiments that are not in its test view.
+            If stratify is True, all folds have (approximately) the same
+            distribution of experiment lengths.
+        """
+        assert 1 < k and k <= len(self.exps)
+        indices = self.shuffled_indices(stratify=stratify)
+        num = len(indices)
+        bounds = [ (num * n) // k for n in range(k + 1) ]
+        res = []
+        for n in range(k):
+            start, end = bounds[n], bounds[n + 1]
+            res.append((self.view(indices[:start] + indices[end:]), self.view(indices[start:end])))
+        return res
 
     def clear(self):
         self.check_modifiable()
@@ -147,21 +236,85 @@ class ExperimentList(jsonable.JSONable):
             num_insns = random.randrange(1, max_num_insns + 1)
             self.insert_random_exp(num_insns)
 
-    def from_json_dict(self, jsondict):
-        self.check_modifiable()
-        assert(jsondict["kind"] == "ExperimentList")
+    def read_arch_json_dict(self, archdict):
         if self.arch is None:
             self.arch = Architecture()
-            self.arch.from_json_dict(jsondict["arch"])
+            self.arch.from_json_dict(archdict)
         else:
-            self.arch.verify_json_dict(jsondict["arch"])
+            self.arch.verify_json_dict(archdict)
+
+    def from_json_dict(self, jsondict):
+        self.check_modifiable()
+        assert(jsondict["kind"] == "ExperimentList")
+        self.read_arch_json_dict(jsondict["arch"])
 
         for edict in jsondict["exps"]:
             e = Experiment(self.arch)
             e.from_json_dict(edict)
             self.insert_exp(e)
 
-    def to_json_dict(self):
+    def stream_json(self, infile, filter=None):
+        """ Incrementally read an ExperimentList in json format from infile
+            and yield the contained experiments that satisfy the predicate
+            filter (if given) one at a time, without inserting them.
+            The architecture of this list is read from (or verified with) the
+            header of the file before the first experiment is yielded.
+        """
+        reader = jsonable.JSONStreamReader(infile)
+        found_arch = False
+        pending = []
+        for key in reader.iter_object():
+            if key == "kind":
+                assert(reader.read_value() == "ExperimentList")
+            elif key == "arch":
+                self.read_arch_json_dict(reader.read_value())
+                found_arch = True
+                # experiments that precede the architecture are kept as dicts
+                for e in self.exps_from_json_dicts(pending, filter):
+                    yield e
+                pending = None
+            elif key == "exps":
+                if found_arch:
+                    for e in self.exps_from_json_dicts(reader.iter_array(), filter):
+                        yield e
+                else:
+                    pending.extend(reader.iter_array())
+            else:
+                reader.read_value()
+        assert(found_arch)
+
+    def exps_from_json_dicts(self, edicts, filter):
+        for edict in edicts:
+            e = Experiment(self.arch)
+            e.from_json_dict(edict)
+            if filter is None or filter(e):
+                yield e
+
+    @classmethod
+    def iter_json(cls, infile, arch=None, filter=None):
+        """ Yield the experiments from the ExperimentList in json format in
+            infile one at a time, see stream_json.
+        """
+        return cls(arch).stream_json(infile, filter=filter)
+
+    @classmethod
+    def from_json(cls, infile, arch=None, filter=None):
+        """ Read an ExperimentList in json format from infile, keeping only
+            the experiments that satisfy the predicate filter (if given).
+            The file is parsed incrementally, so that only the resulting list
+            needs to be kept in memory (use a CompactExperimentList to keep
+            that small as well).
+        """
+        res = cls(arch)
+        res.check_modifiable()
+        for e in res.stream_json(infile, filter=filter):
+            res.insert_exp(e)
+        return res
+
+    def to_json_dict(self, lazy=False):
+        """ If lazy is True, the experiments are represented by a generator
+            (which can be consumed by jsonable.write_json) instead of a list.
+        """
         res = dict()
         res["kind"] = "ExperimentList"
         arch_dict = self.arch.to_json_dict()
@@ -170,7 +323,323 @@ class ExperimentList(jsonable.JSONable):
             res_dict[k] = jsonable.mark_noindent(v)
         res["arch"] = res_dict
 
-        res["exps"] = [ jsonable.mark_noindent(e.to_json_dict()) for e in self.exps ]
+        exps = ( jsonable.mark_noindent(e.to_json_dict()) for e in self.exps )
+        res["exps"] = exps if lazy else list(exps)
 
         return res
 
+    def to_json(self, outfile):
+        # write the experiments without building the complete json dict
+        self.add_metadata()
+        self.write_json(outfile, self.to_json_dict(lazy=True))
+
+
+class ExperimentListView(ExperimentList):
+    """ Unmodifiable ExperimentList that consists of the experiments at an
+        array of indices of another ExperimentList. The experiments are not
+        copied, views of views refer to the original list.
+    """
+    def __init__(self, base, indices, arch=None):
+        jsonable.JSONable.__init__(self)
+        if isinstance(base, ExperimentListView):
+            # keep the (possibly restricted) architecture of the view
+            if arch is None:
+                arch = base.arch
+            indices = [ base.indices[x] for x in indices ]
+            base = base.base
+        self.base = base
+        self.indices = array('q', indices)
+        self.arch = base.arch if arch is None else arch
+        self.modifiable = False
+
+    @property
+    def exps(self):
+        return IndexedExperiments(self.base.exps, self.indices)
+
+    @property
+    def experiment_id(self):
+        return self.base.experiment_id
+
+    def __len__(self):
+        return len(self.indices)
+
+    def get_lengths(self):
+        lengths = self.base.get_lengths()
+        return [ lengths[x] for x in self.indices ]
+
+
+class IndexedExperiments:
+    """ Sequence of the experiments at an array of indices of a sequence of
+        experiments.
+    """
+    def __init__(self, exps, indices):
+        self.base_exps = exps
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [ self.base_exps[x] for x in self.indices[key] ]
+        return self.base_exps[self.indices[key]]
+
+    def __iter__(self):
+        base_exps = self.base_exps
+        for x in self.indices:
+            yield base_exps[x]
+
+    def copy(self):
+        return list(self)
+
+
+class CompactExperimentList(ExperimentList):
+    """ ExperimentList that stores its experiments in flat arrays instead of
+        Experiment objects: the instruction ids of all experiments with
+        offsets per experiment (CSR format), the measured cycles and the
+        cycles for each identifier of other_results (NaN where missing).
+        Other entries of results are not kept.
+
+        The experiments are accessible as lightweight ExperimentView objects
+        that read from and write to these arrays, so that code using the
+        ExperimentList interface keeps working.
+    """
+    def __init__(self, arch=None):
+        jsonable.JSONable.__init__(self)
+        self.arch = arch
+        self.modifiable = True
+
+        # instructions are represented by their index in this list
+        self.insns = []
+        self.insn2id = dict()
+
+        self.insn_ids = array('i')
+        self.offsets = array('q', [0])
+        self.cycles = array('d')
+        self.other_cycles = dict()
+
+    @property
+    def exps(self):
+        return ExperimentViews(self)
+
+    @property
+    def experiment_id(self):
+        return len(self.cycles)
+
+    def __iter__(self):
+        return iter(self.exps)
+
+    def __len__(self):
+        return len(self.cycles)
+
+    def get_insn_id(self, insn):
+        res = self.insn2id.get(insn, None)
+        if res is None:
+            res = len(self.insns)
+            self.insns.append(insn)
+            self.insn2id[insn] = res
+        return res
+
+    def get_iseq(self, idx):
+        insns = self.insns
+        return [ insns[x] for x in self.insn_ids[self.offsets[idx]:self.offsets[idx + 1]] ]
+
+    def get_length(self, idx):
+        return self.offsets[idx + 1] - self.offsets[idx]
+
+    def get_result(self, idx):
+        cycles = self.cycles[idx]
+        if math.isnan(cycles):
+            return None
+        return { "cycles": float(cycles) }
+
+    def set_result(self, idx, result):
+        if result is None or result["cycles"] is None:
+            self.cycles[idx] = math.nan
+        else:
+            self.cycles[idx] = float(result["cycles"])
+
+    def get_other_results(self, idx):
+        res = []
+        for ident, column in self.other_cycles.items():
+            cycles = column[idx]
+            if not math.isnan(cycles):
+                res.append({ "id": ident, "cycles": float(cycles) })
+        return res
+
+    def add_other_result(self, idx, result):
+        ident = result["id"]
+        column = self.other_cycles.get(ident, None)
+        if column is None:
+            column = array('d', [ math.nan ]) * len(self.cycles)
+            self.other_cycles[ident] = column
+        cycles = result["cycles"]
+        column[idx] = math.nan if cycles is None else float(cycles)
+
+    def get_lengths(self):
+        offsets = self.offsets
+        return [ offsets[x + 1] - offsets[x] for x in range(len(self.cycles)) ]
+
+    def clear(self):
+        self.check_modifiable()
+        self.insn_ids = array('i')
+        self.offsets = array('q', [0])
+        self.cycles = array('d')
+        self.other_cycles = dict()
+
+    def make_appendable(self):
+        """ Replace arrays that cannot grow (e.g. memory-mapped numpy arrays
+            from utils.experiment_store) by copies in arrays of the array
+            module.
+        """
+        if not isinstance(self.insn_ids, array):
+            self.insn_ids = array('i', (int(x) for x in self.insn_ids))
+        if not isinstance(self.offsets, array):
+            self.offsets = array('q', (int(x) for x in self.offsets))
+        if not isinstance(self.cycles, array):
+            self.cycles = array('d', (float(x) for x in self.cycles))
+        for ident, column in self.other_cycles.items():
+            if not isinstance(column, array):
+                self.other_cycles[ident] = array('d', (float(x) for x in column))
+
+    def append(self, iseq, result=None, other_results=[]):
+        """ Append an experiment with the instruction list iseq and return a
+            view of it.
+        """
+        self.check_modifiable()
+        self.make_appendable()
+        idx = len(self.cycles)
+        self.insn_ids.extend(self.get_insn_id(i) for i in iseq)
+        self.offsets.append(len(self.insn_ids))
+        self.cycles.append(math.nan)
+        for column in self.other_cycles.values():
+            column.append(math.nan)
+        self.set_result(idx, result)
+        for r in other_results:
+            self.add_other_result(idx, r)
+        return ExperimentView(self, idx)
+
+    def insert_exp(self, e):
+        view = self.append(e.iseq, e.result, e.other_results)
+        e.rid = view.rid
+
+    def create_exp(self, ilist):
+        return self.append(ilist)
+
+    def insert_random_exp(self, num_insns):
+        self.check_modifiable()
+        assert(num_insns > 0)
+        I = self.arch.insn_list()
+        iseq = [ I[random.randrange(len(I))] for x in range(num_insns) ]
+        return self.append(iseq)
+
+    def from_json_dict(self, jsondict):
+        self.check_modifiable()
+        assert(jsondict["kind"] == "ExperimentList")
+        self.read_arch_json_dict(jsondict["arch"])
+
+        insns = self.arch.insns
+        for edict in jsondict["exps"]:
+            assert(edict["kind"] == "Experiment")
+            iseq = [ insns[iname.replace(" ", "_")] for iname in edict["iseq"] ]
+            self.append(iseq, edict["result"], edict.get("other_results", []))
+
+
+class ExperimentViews:
+    """ Sequence of ExperimentView objects for a CompactExperimentList.
+    """
+    def __init__(self, elist):
+        self.elist = elist
+
+    def __len__(self):
+        return len(self.elist)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [ ExperimentView(self.elist, idx) for idx in range(*key.indices(len(self))) ]
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError("experiment index out of range")
+        return ExperimentView(self.elist, key)
+
+    def __iter__(self):
+        elist = self.elist
+        for idx in range(len(elist)):
+            yield ExperimentView(elist, idx)
+
+    def copy(self):
+        return list(self)
+
+
+class OtherResultsView(list):
+    """ List of the other_results of an ExperimentView, appending to it adds
+        the result to the underlying CompactExperimentList.
+    """
+    def __init__(self, view):
+        super().__init__(view.elist.get_other_results(view.rid))
+        self.view = view
+
+    def append(self, result):
+        super().append(result)
+        self.view.elist.add_other_result(self.view.rid, result)
+
+    def extend(self, results):
+        for r in results:
+            self.append(r)
+
+
+class ExperimentView(Experiment):
+    """ Experiment that reads from and writes to the arrays of a
+        CompactExperimentList.
+    """
+    def __init__(self, elist, idx):
+        jsonable.JSONable.__init__(self)
+        self.elist = elist
+        self.idx = idx
+        self._multiset = None
+
+    @property
+    def arch(self):
+        return self.elist.arch
+
+    @property
+    def rid(self):
+        return self.idx
+
+    @property
+    def iseq(self):
+        return self.elist.get_iseq(self.idx)
+
+    @property
+    def result(self):
+        return self.elist.get_result(self.idx)
+
+    @result.setter
+    def result(self, value):
+        self.elist.set_result(self.idx, value)
+
+    @property
+    def other_results(self):
+        return OtherResultsView(self)
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return self.elist is other.elist and self.idx == other.idx
+        return False
+
+    def __hash__(self):
+        return hash(self.idx)
+
+    def from_json_dict(self, jsondict):
+        """ Read the results of the experiment at this index from jsondict.
+            The instructions of an experiment in a CompactExperimentList
+            cannot be changed, so they have to agree with jsondict.
+        """
+        e = Experiment(self.arch)
+        e.from_json_dict(jsondict)
+        assert list(e.iseq) == list(self.iseq), "ExperimentView: instructions differ from the json data"
+        self.result = e.result
+        for r in e.other_results:
+            self.elist.add_other_result(self.idx, r)
+
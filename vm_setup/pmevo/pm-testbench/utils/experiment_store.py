@@ -0,0 +1,195 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+""" Binary on-disk format for experiment lists.
+
+    A binary experiment list file consists of
+      - the magic bytes b"PMEXPS01",
+      - the length of the header as little-endian uint64,
+      - a json header with the architecture, the table of instruction names,
+        the number of experiments and instruction ids and the identifiers of
+        the other results,
+    followed by flat little-endian arrays, each starting at a multiple of 64
+    bytes:
+      - insn_ids (int32): indices into the instruction table for the
+        instructions of all experiments, one after the other,
+      - offsets (int64): start of each experiment in insn_ids (plus the end
+        of the last one),
+      - cycles (float64): measured cycles per experiment (NaN if missing),
+      - other_cycles (float64): one row of cycles per experiment for each
+        identifier of other results (NaN where missing).
+
+    The arrays can be mapped into memory with numpy.memmap without parsing.
+    Like for a CompactExperimentList, only the cycles of results are kept.
+"""
+
+import json
+import math
+import os
+import struct
+
+from typing import *
+
+from utils.architecture import Architecture
+from utils.experiment import Experiment, ExperimentList, CompactExperimentList
+
+binary_extension = ".bin"
+
+magic = b"PMEXPS01"
+
+alignment = 64
+
+def is_binary_path(path: str):
+    return path.endswith(binary_extension)
+
+def align(pos):
+    return (pos + alignment - 1) // alignment * alignment
+
+def get_layout(header, data_start):
+    """ Compute the (offset, dtype, shape) triples of the arrays in a file with
+        the given header, whose data starts at data_start.
+    """
+    num_exps = header["num_exps"]
+    num_other = len(header["other_ids"])
+    res = dict()
+    pos = data_start
+    for name, dtype, shape, itemsize in [
+            ("insn_ids", "<i4", (header["num_insn_ids"],), 4),
+            ("offsets", "<i8", (num_exps + 1,), 8),
+            ("cycles", "<f8", (num_exps,), 8),
+            ("other_cycles", "<f8", (num_other, num_exps), 8),
+            ]:
+        res[name] = (pos, dtype, shape)
+        size = itemsize
+        for n in shape:
+            size *= n
+        pos = align(pos + size)
+    return res
+
+def write_binary(elist: ExperimentList, outfile):
+    """ Write elist in the binary format to the binary file object outfile.
+    """
+    import numpy as np
+
+    arch = elist.arch
+    insn_table = sorted(arch.insns.values())
+    insn2idx = { i: x for x, i in enumerate(insn_table) }
+
+    if isinstance(elist, CompactExperimentList):
+        local2idx = np.array([ insn2idx[i] for i in elist.insns ], dtype=np.int32)
+        insn_ids = local2idx[np.asarray(elist.insn_ids, dtype=np.int64)]
+        offsets = np.asarray(elist.offsets, dtype=np.int64)
+        cycles = np.asarray(elist.cycles, dtype=np.float64)
+        other_ids = list(elist.other_cycles.keys())
+        other_cycles = np.array([ np.asarray(elist.other_cycles[ident], dtype=np.float64) for ident in other_ids ],
+                dtype=np.float64).reshape((len(other_ids), len(cycles)))
+    else:
+        exps = list(elist.exps)
+        num_exps = len(exps)
+        insn_ids = np.array([ insn2idx[i] for e in exps for i in e.iseq ], dtype=np.int32)
+        offsets = np.zeros(num_exps + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([ len(e.iseq) for e in exps ])
+        cycles = np.array([ math.nan if e.result is None or e.result["cycles"] is None else e.result["cycles"] for e in exps ],
+                dtype=np.float64)
+        other_ids = []
+        columns = dict()
+        for x, e in enumerate(exps):
+            for r in e.other_results:
+                ident = r["id"]
+                column = columns.get(ident, None)
+                if column is None:
+                    other_ids.append(ident)
+                    column = np.full(num_exps, math.nan, dtype=np.float64)
+                    columns[ident] = column
+                if r["cycles"] is not None:
+                    column[x] = r["cycles"]
+        other_cycles = np.array([ columns[ident] for ident in other_ids ],
+                dtype=np.float64).reshape((len(other_ids), num_exps))
+
+    header = dict()
+    header["kind"] = "BinaryExperimentList"
+    header["arch"] = arch.to_json_dict()
+    header["insn_table"] = [ i.name for i in insn_table ]
+    header["num_exps"] = len(cycles)
+    header["num_insn_ids"] = len(insn_ids)
+    header["other_ids"] = other_ids
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    prefix = magic + struct.pack("<Q", len(header_bytes)) + header_bytes
+    layout = get_layout(header, align(len(prefix)))
+
+    outfile.write(prefix)
+    pos = len(prefix)
+    for name, data in [("insn_ids", insn_ids), ("offsets", offsets), ("cycles", cycles), ("other_cycles", other_cycles)]:
+        start, dtype, shape = layout[name]
+        outfile.write(b"\0" * (start - pos))
+        buf = np.ascontiguousarray(data, dtype=dtype).tobytes()
+        outfile.write(buf)
+        pos = start + len(buf)
+
+def read_binary(path: str, arch: Architecture = None):
+    """ Load the binary experiment list in the file at path into a
+        CompactExperimentList whose arrays are memory-mapped (copy-on-write,
+        the file is never modified).
+    """
+    import numpy as np
+
+    with open(path, "rb") as infile:
+        assert infile.read(len(magic)) == magic, "Not a binary experiment list: {}".format(path)
+        header_len, = struct.unpack("<Q", infile.read(8))
+        header = json.loads(infile.read(header_len).decode("utf-8"))
+    assert header["kind"] == "BinaryExperimentList"
+
+    res = CompactExperimentList(arch)
+    res.read_arch_json_dict(header["arch"])
+
+    layout = get_layout(header, align(len(magic) + 8 + header_len))
+
+    def load(name):
+        offset, dtype, shape = layout[name]
+        if 0 in shape:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="c", offset=offset, shape=shape)
+
+    insns = res.arch.insns
+    res.insns = [ insns[n] for n in header["insn_table"] ]
+    res.insn2id = { i: x for x, i in enumerate(res.insns) }
+    res.insn_ids = load("insn_ids")
+    res.offsets = load("offsets")
+    res.cycles = load("cycles")
+    other_cycles = load("other_cycles")
+    res.other_cycles = { ident: other_cycles[x] for x, ident in enumerate(header["other_ids"]) }
+    return res
+
+def load_experiment_list(path: str, arch: Architecture = None, cls=ExperimentList):
+    """ Load an ExperimentList (of class cls) from the file at path, which can
+        be in json or (if its name ends with binary_extension) in binary format.
+    """
+    if not is_binary_path(path):
+        with open(path, "r") as infile:
+            return cls.from_json(infile, arch)
+
+    compact = read_binary(path, arch)
+    if issubclass(cls, CompactExperimentList):
+        return compact
+
+    res = cls(compact.arch)
+    for view in compact:
+        e = Experiment(res.arch, view.iseq, view.result)
+        e.other_results = list(view.other_results)
+        res.insert_exp(e)
+    return res
+
+def store_experiment_list(elist: ExperimentList, path: str):
+    """ Write elist to the file at path, in binary format if its name ends
+        with binary_extension and in json format otherwise.
+        The data is written to a temporary file that replaces the file at
+        path in the end, so that elist may be memory-mapped from that file.
+    """
+    tmpname = path + ".tmp"
+    if is_binary_path(path):
+        with open(tmpname, "wb") as outfile:
+            write_binary(elist, outfile)
+    else:
+        with open(tmpname, "w") as outfile:
+            elist.to_json(outfile)
+    os.replace(tmpname, path)
@@ -2,9 +2,14 @@
 
 from abc import ABC, abstractmethod
 import datetime
+import io
 import json
 import os
+import struct
 import sys
+import time
+import types
+import zlib
 
 try:
     import git
@@ -58,6 +63,9 @@ class Vault:
 
         self.first_entry = (self.last_progress() is None)
 
+    def __len__(self):
+        return len(self.model)
+
     def last_progress(self):
         if len(self.model) == 0:
             return None
@@ -97,19 +105,244 @@ class Vault:
                     self.first_entry = False
                 else:
                     progressfile.write(",\n")
-                print(obj_to_json_str([progress_id, new_data], dump_noindent=True), file=progressfile, end='')
+                write_json([progress_id, new_data], progressfile, dump_noindent=True)
 
         self.to_write.clear()
 
     def finalize(self, delete_progress=True):
-        jsondata = [ data for progress_id, data in self.model]
+        jsondata = ( data for progress_id, data in self.model )
         with open(self.outfilename, "w") as outfile:
-            outfile.write(obj_to_json_str(jsondata))
+            write_json(jsondata, outfile)
             outfile.write("\n")
 
         if delete_progress and os.path.isfile(self.progressfile):
             os.remove(self.progressfile)
 
+class LogVault:
+    """ A persistent progress storage for lists of json data, like Vault, but
+        backed by an append-only log of length-prefixed and checksummed
+        records, so that neither adding entries nor recovering from or
+        finalizing a log requires to hold all entries in memory.
+
+        Entries are buffered and written to the log when buffer_records
+        entries have accumulated (and on save_progress/finalize). The fsync
+        policy determines when written entries are forced to disk: "always"
+        (after every write), "periodic" (at most every fsync_interval
+        seconds) or "never" (left to the operating system).
+        A torn record at the end of the log (e.g. after a crash) is dropped
+        when the log is opened again, a corrupted record before the end is
+        reported as an error.
+    """
+    magic = b"PMVAULTLOG1\n"
+
+    # length of the payload and its crc32 checksum
+    record_header = struct.Struct("<II")
+
+    def __init__(self, outfile=None, progressfile=None, debug=False, buffer_records=1, fsync="periodic", fsync_interval=10.0):
+        assert fsync in ["always", "periodic", "never"]
+        self.debug = debug
+        self.buffer_records = buffer_records
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.default_progress_id = 0
+
+        assert(outfile is not None or progressfile is not None)
+        if outfile is not None:
+            self.outfilename = outfile
+            if progressfile is not None:
+                self.progressfile = progressfile
+            else:
+                self.progressfile = self.outfilename + ".log"
+        else:
+            self.progressfile = progressfile
+            if progressfile.endswith(".json.log"):
+                self.outfilename = progressfile[:-len(".log")]
+            else:
+                self.outfilename = progressfile + ".final.json"
+
+        # map progress ids to the offsets of their records in the log
+        self.index = dict()
+        self.num_records = 0
+        self.last_id = None
+        self.buffer = []
+
+        if os.path.isfile(self.progressfile):
+            if self.debug:
+                print("Found progress log with the name '{}'!".format(self.progressfile), file=sys.stderr)
+            self.recover()
+        else:
+            if self.debug:
+                print("No progress log found with the name '{}'!".format(self.progressfile), file=sys.stderr)
+            with open(self.progressfile, "wb") as logfile:
+                logfile.write(self.magic)
+                logfile.flush()
+                os.fsync(logfile.fileno())
+
+        self.logfile = open(self.progressfile, "ab")
+        self.end_offset = self.logfile.tell()
+        self.last_fsync = time.monotonic()
+
+    @staticmethod
+    def is_log(filename):
+        """ Check whether filename is a progress log of a LogVault.
+        """
+        with open(filename, "rb") as infile:
+            return infile.read(len(LogVault.magic)) == LogVault.magic
+
+    def __len__(self):
+        return self.num_records + len(self.buffer)
+
+    def __contains__(self, progress_id):
+        return progress_id in self.index
+
+    def last_progress(self):
+        return self.last_id
+
+    def read_records(self, infile):
+        """ Yield (offset, progress id json, data json) triples for the
+            records in the log file infile, starting at the current position,
+            until the end or a torn record at the end.
+            A ValueError is raised for a corrupted record that is not the
+            last one.
+        """
+        header_size = self.record_header.size
+        offset = infile.tell()
+        file_size = os.fstat(infile.fileno()).st_size
+        while offset < file_size:
+            header = infile.read(header_size)
+            if offset + header_size > file_size:
+                # the header of the last record is incomplete
+                return
+            length, checksum = self.record_header.unpack(header)
+            record_end = offset + header_size + length
+            if record_end > file_size:
+                # the last record is incomplete, unless the length is
+                # corrupted and valid records follow
+                if self.find_record(infile, offset + 1, file_size) is not None:
+                    raise ValueError("corrupted record length at offset {} of '{}'".format(offset, self.progressfile))
+                return
+            payload = infile.read(length)
+            if zlib.crc32(payload) != checksum:
+                if record_end == file_size:
+                    # the last record has not been written completely
+                    return
+                raise ValueError("corrupted record at offset {} of '{}'".format(offset, self.progressfile))
+            id_str, data_str = payload.decode("utf-8").split("\n", 1)
+            yield offset, id_str, data_str
+            offset = record_end
+
+    def find_record(self, infile, start, file_size):
+        """ Get the offset of the first position after start in infile at
+            which a record with a valid checksum starts, or None.
+        """
+        header_size = self.record_header.size
+        infile.seek(start)
+        data = infile.read(file_size - start)
+        for pos in range(len(data) - header_size + 1):
+            length, checksum = self.record_header.unpack_from(data, pos)
+            payload_start = pos + header_size
+            if payload_start + length <= len(data) and zlib.crc32(data[payload_start:payload_start + length]) == checksum:
+                return start + pos
+        return None
+
+    def recover(self):
+        """ Build the index from an existing log and cut off a torn record at
+            its end.
+        """
+        with open(self.progressfile, "rb") as infile:
+            if infile.read(len(self.magic)) != self.magic:
+                print("Vault Error: '{}' is not a progress log!".format(self.progressfile), file=sys.stderr)
+                sys.exit(73)
+            end = infile.tell()
+            try:
+                for offset, id_str, data_str in self.read_records(infile):
+                    progress_id = json.loads(id_str)
+                    self.index[progress_id] = offset
+                    self.last_id = progress_id
+                    self.num_records += 1
+                    # do not hand out ids of replayed entries again
+                    if isinstance(progress_id, int) and progress_id >= self.default_progress_id:
+                        self.default_progress_id = progress_id + 1
+                    end = infile.tell()
+            except ValueError as e:
+                print("Vault Error: Failed to recover progress: {}!\n  Fix or remove the file to continue.".format(e), file=sys.stderr)
+                sys.exit(73)
+            file_end = infile.seek(0, os.SEEK_END)
+
+        if end != file_end:
+            print("Vault Warning: dropping a torn record at the end of '{}'.".format(self.progressfile), file=sys.stderr)
+            with open(self.progressfile, "r+b") as logfile:
+                logfile.truncate(end)
+
+    def add(self, new_data, progress_id=None, do_save=True):
+        if progress_id is None:
+            progress_id = self.default_progress_id
+            self.default_progress_id += 1
+        payload = (json.dumps(progress_id) + "\n" + obj_to_json_str(new_data, dump_noindent=True)).encode("utf-8")
+        self.buffer.append((progress_id, payload))
+        self.last_id = progress_id
+        if do_save and len(self.buffer) >= self.buffer_records:
+            self.save_progress()
+
+    def save_progress(self, force_sync=False):
+        if len(self.buffer) > 0:
+            chunks = []
+            for progress_id, payload in self.buffer:
+                self.index[progress_id] = self.end_offset
+                record = self.record_header.pack(len(payload), zlib.crc32(payload)) + payload
+                chunks.append(record)
+                self.end_offset += len(record)
+            self.logfile.write(b"".join(chunks))
+            self.logfile.flush()
+            self.num_records += len(self.buffer)
+            self.buffer.clear()
+
+        now = time.monotonic()
+        if (force_sync or self.fsync == "always" or
+                (self.fsync == "periodic" and now - self.last_fsync >= self.fsync_interval)):
+            os.fsync(self.logfile.fileno())
+            self.last_fsync = now
+
+    def iter_entries(self):
+        """ Yield the (progress id, data) pairs of all entries in the log.
+        """
+        self.save_progress()
+        with open(self.progressfile, "rb") as infile:
+            infile.seek(len(self.magic))
+            for offset, id_str, data_str in self.read_records(infile):
+                yield json.loads(id_str), json.loads(data_str)
+
+    def get(self, progress_id):
+        """ Read the data of the (last) entry with the given progress id from
+            the log.
+        """
+        self.save_progress()
+        with open(self.progressfile, "rb") as infile:
+            infile.seek(self.index[progress_id])
+            for offset, id_str, data_str in self.read_records(infile):
+                return json.loads(data_str)
+
+    def close(self):
+        self.save_progress(force_sync=True)
+        self.logfile.close()
+
+    def finalize(self, delete_progress=True):
+        """ Write the data of all entries as a json list to the output file.
+            Entries are streamed from the log one at a time.
+        """
+        self.save_progress(force_sync=True)
+        jsondata = ( data for progress_id, data in self.iter_entries() )
+        tmpname = self.outfilename + ".tmp"
+        with open(tmpname, "w") as outfile:
+            write_json(jsondata, outfile)
+            outfile.write("\n")
+        os.replace(tmpname, self.outfilename)
+
+        if delete_progress:
+            self.logfile.close()
+            if os.path.isfile(self.progressfile):
+                os.remove(self.progressfile)
+
 def mark_noindent(obj):
     return ["__noindent__", obj]
 
@@ -124,39 +357,156 @@ def unwrap_noindent(obj):
 indent_str = "  "
 
 def obj_to_json_str(obj, indent=0, dump_noindent=False):
-    if is_noindent(obj):
-        if dump_noindent:
-            return json.dumps(obj)
+    buf = io.StringIO()
+    write_json(obj, buf, indent=indent, dump_noindent=dump_noindent)
+    return buf.getvalue()
+
+def write_json(obj, outfile, indent=0, dump_noindent=False):
+    """ Write obj in json format to outfile. Lists and dicts are indented,
+        except for those marked with mark_noindent, which are written in a
+        single line. Generators are written like lists.
+        The output is written piecewise, so that the document is never
+        completely held in memory.
+    """
+    write = outfile.write
+
+    def rec(obj, indent, dump_noindent):
+        if is_noindent(obj):
+            if dump_noindent:
+                write(json.dumps(obj))
+            else:
+                write(json.dumps(obj[1]))
+        elif isinstance(obj, dict):
+            sep = ",\n" + (indent + 1) * indent_str
+            write("{\n" + (indent + 1) * indent_str)
+            first = True
+            for k, v in obj.items():
+                if not first:
+                    write(sep)
+                first = False
+                rec(k, indent + 1, dump_noindent)
+                write(": ")
+                rec(v, indent + 1, dump_noindent)
+            write("\n" + indent * indent_str + "}")
+        elif isinstance(obj, (list, types.GeneratorType)):
+            sep = ",\n" + (indent + 1) * indent_str
+            write("[\n" + (indent + 1) * indent_str)
+            first = True
+            for v in obj:
+                if not first:
+                    write(sep)
+                first = False
+                rec(v, indent + 1, dump_noindent)
+            write("\n" + indent * indent_str + "]")
+        elif isinstance(obj, JSONable):
+            rec(obj.to_json_dict(), 0, False)
+        elif isinstance(obj, int):
+            write('"{}"'.format(obj))
         else:
-            return json.dumps(unwrap_noindent(obj))
-    elif isinstance(obj, dict):
-        res = "{\n" + (indent + 1) * indent_str
-        first = True
-        for k, v in obj.items():
-            if not first:
-                res += ",\n" + (indent + 1) * indent_str
-            first = False
-            res += obj_to_json_str(k, indent + 1, dump_noindent=dump_noindent)
-            res += ": "
-            res += obj_to_json_str(v, indent + 1, dump_noindent=dump_noindent)
-        res += "\n" + indent * indent_str + "}"
-        return res
-    elif isinstance(obj, list):
-        res = "[\n" + (indent + 1) * indent_str
-        first = True
-        for v in obj:
-            if not first:
-                res += ",\n" + (indent + 1) * indent_str
-            first = False
-            res += obj_to_json_str(v, indent + 1, dump_noindent=dump_noindent)
-        res += "\n" + indent * indent_str + "]"
-        return res
-    elif isinstance(obj, JSONable):
-        return obj_to_json_str(obj.to_json_dict())
-    elif isinstance(obj, int):
-        return '"{}"'.format(obj)
-    else:
-        return json.dumps(obj)
+            write(json.dumps(obj))
+
+    rec(obj, indent, dump_noindent)
+
+class JSONStreamReader:
+    """ Incremental reader for json files that allows to walk through the
+        top-level objects and arrays without loading the whole file.
+        Values below that level are decoded as a whole with the json module.
+    """
+    # characters that may follow a complete json value
+    delimiters = " \t\n\r,:]}"
+
+    def __init__(self, infile, chunk_size=1<<16):
+        self.infile = infile
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """ Read more data into the buffer, at least as much as is currently
+            pending, so that repeatedly failing to decode a large value takes
+            linear time overall.
+            Returns False if the end of the file has been reached.
+        """
+        if self.eof:
+            return False
+        pending = len(self.buf) - self.pos
+        data = self.infile.read(max(self.chunk_size, pending))
+        if len(data) == 0:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """ Skip whitespace and return the next character (or None at the end
+            of the file) without consuming it.
+        """
+        while True:
+            buf = self.buf
+            pos = self.pos
+            while pos < len(buf) and buf[pos] in " \t\n\r":
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self.fill():
+                return None
+
+    def expect(self, chars):
+        c = self.peek()
+        if c is None or c not in chars:
+            raise json.JSONDecodeError("Expected one of '{}'".format(chars), self.buf, self.pos)
+        self.pos += 1
+        return c
+
+    def read_value(self):
+        """ Decode the next json value as a whole.
+        """
+        self.peek()
+        while True:
+            try:
+                val, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number is only complete if it is followed by a delimiter,
+                # "1." or "12e" at the end of the buffer decode to a prefix
+                if self.eof or (end < len(self.buf) and self.buf[end] in self.delimiters):
+                    self.pos = end
+                    return val
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def iter_object(self):
+        """ Iterate over the keys of the next json object. The corresponding
+            value has to be consumed (e.g. with read_value or iter_array)
+            before advancing the iterator.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            assert isinstance(key, str)
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def iter_array(self):
+        """ Iterate over the decoded elements of the next json array.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            if self.expect(",]") == "]":
+                return
 
 class JSONable(ABC):
     # TODO get_kind(self)
@@ -185,14 +535,19 @@ class JSONable(ABC):
     def to_json_dict(self):
         pass
 
+    def annotate_metadata(self, jsondict):
+        if self.metadata is None:
+            return jsondict
+        annotated_dict = { k: v for k, v in jsondict.items() }
+        assert "metadata" not in annotated_dict
+        annotated_dict["metadata"] = self.metadata
+        return annotated_dict
+
     def to_json_str(self, jsondict):
-        if self.metadata is not None:
-            annotated_dict = { k: v for k, v in jsondict.items() }
-            assert "metadata" not in annotated_dict
-            annotated_dict["metadata"] = self.metadata
-            return obj_to_json_str(annotated_dict)
-        else:
-            return obj_to_json_str(jsondict)
+        return obj_to_json_str(self.annotate_metadata(jsondict))
+
+    def write_json(self, outfile, jsondict):
+        write_json(self.annotate_metadata(jsondict), outfile)
 
     def __str__(self):
         jsondict = self.to_json_dict()
@@ -216,7 +571,7 @@ class JSONable(ABC):
     def to_json(self, outfile):
         self.add_metadata()
         jsondict = self.to_json_dict()
-        outfile.write(self.to_json_str(jsondict))
+        self.write_json(outfile, jsondict)
         # json.dump(jsondict, outfile, indent=2, separators=(",", ": "))
 
 
@@ -8,15 +8,168 @@ import json
 from utils.architecture import Architecture
 import utils.jsonable as jsonable
 
+def track(owner, value):
+    """ Wrap (nested) lists in value into TrackedLists that notify owner.
+    """
+    if isinstance(value, TrackedList) and value.owner is owner:
+        return value
+    if isinstance(value, list):
+        return TrackedList(owner, value)
+    return value
+
+
+class TrackedList(list):
+    """ List in the assignment of a Mapping (e.g. the uops of an instruction
+        or the ports of a uop) that notifies the Mapping whenever it is
+        modified in place.
+    """
+    def __init__(self, owner, items=()):
+        super().__init__(track(owner, v) for v in items)
+        self.owner = owner
+
+    def __reduce__(self):
+        # copy and pickle as plain lists, the Assignment wraps them again
+        return (list, (list(self),))
+
+    def touch(self):
+        self.owner.touch()
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            value = [ track(self.owner, v) for v in value ]
+        else:
+            value = track(self.owner, value)
+        super().__setitem__(key, value)
+        self.touch()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.touch()
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, other):
+        res = super().__imul__(other)
+        self.touch()
+        return res
+
+    def append(self, value):
+        super().append(track(self.owner, value))
+        self.touch()
+
+    def extend(self, values):
+        super().extend([ track(self.owner, v) for v in values ])
+        self.touch()
+
+    def insert(self, idx, value):
+        super().insert(idx, track(self.owner, value))
+        self.touch()
+
+    def pop(self, *args):
+        res = super().pop(*args)
+        self.touch()
+        return res
+
+    def remove(self, value):
+        super().remove(value)
+        self.touch()
+
+    def clear(self):
+        super().clear()
+        self.touch()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self.touch()
+
+    def reverse(self):
+        super().reverse()
+        self.touch()
+
+
+class Assignment(dict):
+    """ Dictionary for the assignment of a Mapping that notifies the Mapping
+        whenever an entry is changed. List entries are stored as TrackedLists,
+        so that modifying them in place notifies the Mapping as well.
+    """
+    def __init__(self, owner, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.owner = owner
+        for k, v in super().items():
+            super().__setitem__(k, track(owner, v))
+
+    def __reduce__(self):
+        # copy and pickle without triggering notifications
+        return (Assignment, (self.owner, dict(self)))
+
+    def touch(self):
+        self.owner.touch()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, track(self.owner, value))
+        self.touch()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.touch()
+
+    def clear(self):
+        super().clear()
+        self.touch()
+
+    def pop(self, *args):
+        res = super().pop(*args)
+        self.touch()
+        return res
+
+    def popitem(self):
+        res = super().popitem()
+        self.touch()
+        return res
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for k, v in dict(*args, **kwargs).items():
+            super().__setitem__(k, track(self.owner, v))
+        self.touch()
+
+
 class Mapping(jsonable.JSONable):
     """ Abstract base class for port mappings.
+
+        Every change of the assignment increments the version of the mapping,
+        which allows users (like simulation processors) to invalidate data that
+        they derived from the mapping. This includes in-place modifications of
+        the lists in the assignment.
     """
     def __init__(self):
         super().__init__()
+        self.version = 0
+        self._assignment = Assignment(self)
+
+    @property
+    def assignment(self):
+        return self._assignment
+
+    @assignment.setter
+    def assignment(self, value):
+        self._assignment = Assignment(self, value)
+        self.touch()
+
+    def touch(self):
+        """ Mark the mapping as changed.
+        """
+        self.version += 1
 
     @staticmethod
     def read_from_json_dict(jsondict, arch: Architecture = None):
-        assert(jsondict["kind"] in ["Mapping2", "Mapping3"])
+        assert(jsondict["kind"] in ["Mapping2", "Mapping3", "MaskMapping"])
 
         if arch is None:
             arch = Architecture()
@@ -34,6 +187,11 @@ class Mapping(jsonable.JSONable):
             res.from_json_dict(jsondict)
             return res
 
+        if jsondict["kind"] == "MaskMapping":
+            res = MaskMapping(arch)
+            res.from_json_dict(jsondict)
+            return res
+
         raise NotImplementedError("read_from_json")
 
     @staticmethod
@@ -265,3 +423,151 @@ class Mapping2(Mapping):
             if v:
                 res.assignment[i].append(p)
         return res
+
+
+class MaskMapping(Mapping):
+    """ Compact representation of port mappings where instructions are
+        decomposed into uops that can be executed on ports.
+
+        The assignment maps each instruction to a sorted tuple of uops, where
+        each uop is represented by an integer bitmask of the ports that can
+        execute it (bit x stands for the x-th port of arch.port_list()).
+        Since the entries are immutable, copies need not be deep, and
+        comparing the entries of an instruction is cheap. This allows for fast
+        equality checks, hashing and diffs of mappings.
+        A Mapping2 is represented with a single uop per instruction.
+    """
+    def __init__(self, arch: Architecture):
+        super().__init__()
+        self.arch = arch
+
+        self.ports = arch.port_list()
+        self.port2bit = { p: x for x, p in enumerate(self.ports) }
+
+        self.hash_cache = None
+
+        # an assignment from instructions to sorted tuples of bitmasks
+        self.assignment = { i: () for i in self.arch.insn_list() }
+
+    def __getitem__(self, key):
+        assert key in self.assignment
+        return self.assignment[key]
+
+    def __repr__(self):
+        res = "MaskMapping(arch={}, assignment={})".format(repr(self.arch), repr(self.assignment))
+        return res
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return False
+        return self.ports == other.ports and self.assignment == other.assignment
+
+    def __hash__(self):
+        cache = self.hash_cache
+        if cache is None or cache[0] != self.version:
+            cache = (self.version, hash(frozenset(self.assignment.items())))
+            self.hash_cache = cache
+        return cache[1]
+
+    def ports_to_mask(self, ports):
+        res = 0
+        for p in ports:
+            res |= 1 << self.port2bit[p]
+        return res
+
+    def mask_to_ports(self, mask):
+        return [ p for x, p in enumerate(self.ports) if (mask >> x) & 1 ]
+
+    def set_uops(self, insn, uops):
+        """ Set the uops of insn from a list of lists of ports.
+        """
+        self.assignment[insn] = tuple(sorted(self.ports_to_mask(u) for u in uops))
+
+    def get_uops(self, insn):
+        """ Get the uops of insn as a list of lists of ports.
+        """
+        return [ self.mask_to_ports(m) for m in self.assignment[insn] ]
+
+    def copy(self):
+        res = MaskMapping(self.arch)
+        res.assignment = self.assignment
+        return res
+
+    def diff(self, other):
+        """ Get a dictionary that maps the instructions whose entries differ
+            between this and the other MaskMapping to pairs of their entries
+            in this and the other mapping (None if not present).
+        """
+        assert self.ports == other.ports
+        res = dict()
+        for i, masks in self.assignment.items():
+            other_masks = other.assignment.get(i, None)
+            if masks != other_masks:
+                res[i] = (masks, other_masks)
+        for i, other_masks in other.assignment.items():
+            if i not in self.assignment:
+                res[i] = (None, other_masks)
+        return res
+
+    @classmethod
+    def from_mapping(cls, mapping: Mapping):
+        """ Create a MaskMapping from a Mapping3 or Mapping2.
+        """
+        res = cls(mapping.arch)
+        assignment = dict()
+        if isinstance(mapping, Mapping3):
+            for i, us in mapping.assignment.items():
+                assignment[i] = tuple(sorted(res.ports_to_mask(u) for u in us))
+        elif isinstance(mapping, Mapping2):
+            for i, ps in mapping.assignment.items():
+                assignment[i] = (res.ports_to_mask(ps),)
+        elif isinstance(mapping, MaskMapping):
+            assert res.ports == mapping.ports
+            assignment = mapping.assignment
+        else:
+            raise NotImplementedError("from_mapping")
+        res.assignment = assignment
+        return res
+
+    def to_mapping3(self):
+        res = Mapping3(self.arch)
+        res.assignment = { i: [ self.mask_to_ports(m) for m in masks ] for i, masks in self.assignment.items() }
+        return res
+
+    def to_mapping2(self):
+        """ Convert to a Mapping2, which requires exactly one uop for each
+            instruction.
+        """
+        res = Mapping2(self.arch)
+        assignment = dict()
+        for i, masks in self.assignment.items():
+            assert len(masks) == 1, "Mapping2 requires exactly one uop per instruction"
+            assignment[i] = self.mask_to_ports(masks[0])
+        res.assignment = assignment
+        return res
+
+    def to_json_dict(self):
+        res = dict()
+        res["kind"] = "MaskMapping"
+
+        arch_dict = self.arch.to_json_dict()
+        res_dict = dict()
+        for k, v in arch_dict.items():
+            res_dict[k] = jsonable.mark_noindent(v)
+        res["arch"] = res_dict
+
+        assignment_dict = dict()
+        for i, masks in self.assignment.items():
+            assignment_dict[i.name] = jsonable.mark_noindent(list(masks))
+        res["assignment"] = assignment_dict
+
+        return res
+
+    def from_json_dict(self, jsondict):
+        assert(jsondict["kind"] == "MaskMapping")
+        arch = self.arch
+        assignment_dict = jsondict["assignment"]
+        assignment = dict(self.assignment)
+        for i, masks in assignment_dict.items():
+            assignment[arch.insns[i]] = tuple(sorted(masks))
+        self.assignment = assignment
@@ -0,0 +1,133 @@
+# vim: et:ts=4:sw=4:fenc=utf-8
+
+from collections import Counter
+import datetime
+import hashlib
+import json
+import sqlite3
+
+from typing import *
+
+
+def compute_fingerprint(description, insn_names, num_ports):
+    """ Compute a fingerprint for a measurement server from its description,
+        the names of its instructions and its number of ports.
+    """
+    data = json.dumps([description, sorted(insn_names), num_ports])
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+def canonical_experiment(insn_names):
+    """ Get a canonical string for the multiset of the given instruction
+        names, independent of their order.
+    """
+    return json.dumps(sorted(Counter(insn_names).items()))
+
+def canonical_params(params):
+    return json.dumps(params, sort_keys=True)
+
+
+class MeasurementStore:
+    """ Persistent store for measurement results in an SQLite database.
+
+        Results are addressed by the fingerprint of the measurement server,
+        the multiset of instructions of the experiment and the parameters of
+        the measurement (e.g. repetitions, target time and instructions per
+        iteration), so that they can be reused across runs.
+        Only successful measurements (with a cycles value) are stored.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.open()
+
+    def open(self):
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS servers (
+                fingerprint TEXT PRIMARY KEY,
+                description TEXT)""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS measurements (
+                fingerprint TEXT,
+                experiment TEXT,
+                params TEXT,
+                result TEXT,
+                creation_date TEXT,
+                hits INTEGER DEFAULT 0,
+                PRIMARY KEY (fingerprint, experiment, params))""")
+        self.db.commit()
+
+    def __getstate__(self):
+        # the connection is reopened after unpickling
+        state = self.__dict__.copy()
+        del state["db"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.open()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def register_server(self, fingerprint, description):
+        self.db.execute("INSERT OR REPLACE INTO servers VALUES (?, ?)", (fingerprint, description))
+        self.db.commit()
+
+    def lookup(self, fingerprint, insn_names, params):
+        """ Get the stored result for the given experiment or None.
+        """
+        key = (fingerprint, canonical_experiment(insn_names), canonical_params(params))
+        row = self.db.execute("""SELECT result FROM measurements
+                WHERE fingerprint = ? AND experiment = ? AND params = ?""", key).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.db.execute("""UPDATE measurements SET hits = hits + 1
+                WHERE fingerprint = ? AND experiment = ? AND params = ?""", key)
+        self.db.commit()
+        return json.loads(row[0])
+
+    def insert(self, fingerprint, insn_names, params, result):
+        if result.get("cycles", None) is None:
+            return
+        key = (fingerprint, canonical_experiment(insn_names), canonical_params(params))
+        self.db.execute("INSERT OR REPLACE INTO measurements VALUES (?, ?, ?, ?, ?, 0)",
+                key + (json.dumps(result), datetime.datetime.now().isoformat()))
+        self.db.commit()
+        self.inserts += 1
+
+    def invalidate(self, fingerprint):
+        """ Remove all results for the server with the given fingerprint and
+            return their number.
+        """
+        cur = self.db.execute("DELETE FROM measurements WHERE fingerprint = ?", (fingerprint,))
+        self.db.execute("DELETE FROM servers WHERE fingerprint = ?", (fingerprint,))
+        self.db.commit()
+        return cur.rowcount
+
+    def get_servers(self):
+        """ Get a list of (fingerprint, description, number of results, number
+            of hits) tuples for all servers with stored results.
+        """
+        return self.db.execute("""SELECT m.fingerprint, s.description, COUNT(*), SUM(m.hits)
+                FROM measurements m LEFT JOIN servers s ON m.fingerprint = s.fingerprint
+                GROUP BY m.fingerprint ORDER BY m.fingerprint""").fetchall()
+
+    def get_stats(self):
+        """ Get a dictionary with statistics about the use of the store in
+            this session.
+        """
+        res = dict()
+        res["hits"] = self.hits
+        res["misses"] = self.misses
+        res["inserts"] = self.inserts
+        return res
@@ -3,8 +3,8 @@ import itertools
 import sys
 
 from utils.architecture import Architecture
-from utils.experiment import ExperimentList
-from utils.mapping import Mapping3
+from utils.experiment import ExperimentListView
+from utils.mapping import Mapping3, MaskMapping
 
 def create_partition(elems, equiv_map):
     """ Partition a collection of elements into buckets of equivalent elements.
@@ -123,26 +123,22 @@ def restrict_elist(elist, insn_representatives):
     whitelist = insn_representatives
     new_arch.insns = { n: i for n, i in arch.insns.items() if i in whitelist }
 
-    new_elist = ExperimentList(new_arch)
-    for e in elist:
-        new_iseq = []
-        for i in e.iseq:
-            if i not in whitelist:
-                new_iseq = None
-                break
-            new_iseq.append(i)
-        if new_iseq is None:
-            continue
-        new_exp = new_elist.create_exp(new_iseq)
-        new_exp.result = e.result
-        new_exp.other_results = e.other_results
-
-    return new_elist
+    # keep the experiments that only consist of whitelisted instructions
+    whitelist = set(whitelist)
+    selected = [ x for x, e in enumerate(elist.exps) if whitelist.issuperset(e.iseq) ]
+    return ExperimentListView(elist, selected, arch=new_arch)
 
 def generalize_mapping(old_arch, mapping, insn_to_representative):
+    insns = old_arch.insn_list()
+    if isinstance(mapping, MaskMapping):
+        # entries are immutable and can be shared
+        new_mapping = MaskMapping(old_arch)
+        assert new_mapping.ports == mapping.ports
+        new_mapping.assignment = { i: mapping.assignment[insn_to_representative[i]] for i in insns }
+        return new_mapping
+
     assert isinstance(mapping, Mapping3)
     new_mapping = Mapping3(old_arch)
-    insns = old_arch.insn_list()
     for i in insns:
         representative = insn_to_representative[i]
         new_mapping.assignment[i] = mapping.assignment[representative][:]